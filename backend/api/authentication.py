@@ -0,0 +1,55 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.metrics import observe_cache
+
+TOKEN_CACHE_KEY = 'auth_token:{}'
+
+
+def token_cache_key(key):
+    """Ключ кэша по хешу токена, чтобы сам токен не попадал в кэш."""
+    return TOKEN_CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def evict_token_on_commit(key):
+    """Удаляет токен из кэша после фиксации транзакции, чтобы
+    параллельный запрос не закэшировал его заново до неё."""
+    transaction.on_commit(lambda: caches[settings.AUTH_TOKEN_CACHE].delete(
+        token_cache_key(key)))
+
+
+def evict_user_tokens(users):
+    """Удаляет из кэша токены пользователей users (queryset или
+    список id) вместе с закэшированными объектами пользователей."""
+    for key in Token.objects.filter(user__in=users).values_list(
+            'key', flat=True):
+        evict_token_on_commit(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, запоминающий токен вместе с пользователем
+    на AUTH_TOKEN_CACHE_TIMEOUT секунд, чтобы не делать JOIN токена
+    и пользователя на каждом запросе.
+
+    Запись удаляется сразу при удалении токена (выход), при любом
+    изменении пользователя, в том числе деактивации, — см. api.signals,
+    и при изменении его счётчиков (api.views.change_counter).
+    Кэш AUTH_TOKEN_CACHE должен быть общим для всех процессов, иначе
+    отозванный токен доживёт в других воркерах до конца TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[settings.AUTH_TOKEN_CACHE]
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        observe_cache('auth_token', token is not None)
+        if token is not None:
+            return token.user, token
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return user, token
@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+TAGS_VERSION_KEY = 'tags_version'
+RECIPES_VERSION_KEY = 'recipes_version'
+USERS_VERSION_KEY = 'users_version'
+POPULARITY_VERSION_KEY = 'popularity_version'
+USER_STATE_VERSION_KEY = 'user_state_version:{}'
+
+
+def get_version(key):
+    """Текущая версия данных, общая для всех процессов при общем кэше.
+
+    Версия — время последнего изменения в наносекундах. Если ключа нет
+    (кэш очищен или перезапущен), версией становится текущее время,
+    чтобы она не совпала ни с одной выданной ранее.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Обновляет версию, делая устаревшими все значения под ней."""
+    cache.set(key, time.time_ns(), None)
+
+
+def bump_version_on_commit(key):
+    """Обновляет версию после фиксации текущей транзакции, чтобы
+    параллельный запрос не закрепил новую версию за старыми данными."""
+    transaction.on_commit(lambda: bump_version(key))
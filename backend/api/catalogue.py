@@ -0,0 +1,75 @@
+import gzip
+from threading import Lock
+
+import brotli
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from foodgram.metrics import observe_cache
+
+from .cache import get_version
+from .renderers import ORJSONRenderer
+
+ENCODINGS = ('br', 'gzip')
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых (q=0)."""
+    encodings = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        encoding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+class RenderedCatalogue:
+    """Готовый JSON каталога и его сжатые копии в памяти процесса.
+
+    Каталог пересобирается, когда меняется общая для всех воркеров версия
+    version_key; пока один поток пересобирает, остальные отдают прежнюю
+    копию. Ответ — это копирование готовых байтов, без сериализации.
+    """
+
+    def __init__(self, version_key, get_data):
+        self.version_key = version_key
+        self.get_data = get_data
+        self._encoded = None
+        self._version = None
+        self._lock = Lock()
+
+    def build(self):
+        content = ORJSONRenderer().render(self.get_data())
+        return {
+            None: content,
+            'gzip': gzip.compress(content),
+            'br': brotli.compress(content),
+        }
+
+    def get_encoded(self):
+        version = get_version(self.version_key)
+        if self._encoded is not None and self._version == version:
+            observe_cache('catalogue', True)
+            return self._encoded
+        observe_cache('catalogue', False)
+        blocking = self._encoded is None
+        if self._lock.acquire(blocking=blocking):
+            try:
+                if self._encoded is None or self._version != version:
+                    self._encoded = self.build()
+                    self._version = version
+            finally:
+                self._lock.release()
+        return self._encoded
+
+    def response(self, request):
+        encoded = self.get_encoded()
+        accepted = accepted_encodings(request)
+        encoding = next((encoding for encoding in ENCODINGS
+                         if encoding in accepted), None)
+        response = HttpResponse(encoded[encoding],
+                                content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
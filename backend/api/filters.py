@@ -1,15 +1,55 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import (Case, CharField, Exists, F, FloatField,
+                              IntegerField, OuterRef, Q, Value, When)
+from django.db.models.functions import Cast
+from django.db.models.lookups import IContains
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import SEARCH_CONFIG, Ingredient, Recipe, Tag
+
+
+@CharField.register_lookup
+class ILikeContains(IContains):
+    """icontains через ILIKE. Стандартный icontains в PostgreSQL даёт
+    UPPER(name) LIKE UPPER(...), и триграммный индекс по name ему
+    не подходит, а ILIKE он обслуживает."""
+    lookup_name = 'ilike_contains'
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = compiler.compile(self.lhs)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', lhs_params + rhs_params
 
 
 class IngredientFilter(FilterSet):
     """Фильтрация ингредиентов по названию."""
     name = filters.CharFilter(lookup_expr="startswith")
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Ingredient
-        fields = ("name",)
+        fields = ("name", "search")
+
+    def filter_search(self, queryset, name, value):
+        """Поиск с опечатками: сначала совпадения по началу названия,
+        затем по подстроке, затем похожие по триграммам (только
+        PostgreSQL с pg_trgm)."""
+        rank = Case(
+            When(name__istartswith=value, then=Value(0)),
+            When(name__icontains=value, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField())
+        if connection.vendor == 'postgresql':
+            return queryset.filter(
+                Q(name__ilike_contains=value)
+                | Q(name__trigram_similar=value)
+            ).annotate(
+                rank=rank, similarity=TrigramSimilarity('name', value)
+            ).order_by('rank', '-similarity', 'name')
+        return queryset.filter(name__icontains=value).annotate(
+            rank=rank).order_by('rank', 'name')
 
 
 class RecipeFilter(FilterSet):
@@ -18,22 +58,65 @@ class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all())
+        queryset=Tag.objects.all(),
+        method='filter_tags')
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('-favorites_count', 'Сначала популярные'),),
+        method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов. EXISTS вместо JOIN
+        не размножает рецепты с несколькими тегами и не требует
+        DISTINCT."""
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=[tag.id for tag in value])))
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shoppingcart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с сортировкой
+        по релевантности. Без PostgreSQL — поиск подстроки, где совпадения
+        в названии идут первыми.
+
+        ts_rank возвращает real, а курсор пагинации сравнивает ранг
+        с сохранённым значением на равенство, поэтому ранг приводится
+        к double precision, который точно переживает JSON."""
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(value, config=SEARCH_CONFIG,
+                                search_type='websearch')
+            return queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F('search_vector'), query),
+                          FloatField())
+            ).order_by('-rank', *Recipe._meta.ordering)
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(rank=Case(
+            When(name__icontains=value, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField())
+        ).order_by('-rank', *Recipe._meta.ordering)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по счётчику избранного, покрытая индексом
+        recipe_favorites_count_idx."""
+        return queryset.order_by(value, '-id')
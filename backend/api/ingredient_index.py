@@ -0,0 +1,75 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+
+from .cache import bump_version_on_commit, get_version
+
+VERSION_KEY = 'ingredient_index_version'
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Строится лениво при первом обращении: отсортированный список названий
+    в нижнем регистре и список уже сериализованных ингредиентов в том же
+    порядке. Поиск выполняется бинарным поиском и не обращается к базе.
+    При изменении ингредиентов версия в кэше увеличивается, и индекс
+    перестраивается одним потоком, пока остальные читают старую копию.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._lock = Lock()
+
+    @staticmethod
+    def build():
+        """Строит новую копию индекса одним запросом к базе."""
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: ingredient['name'].lower())
+        keys = [ingredient['name'].lower() for ingredient in ingredients]
+        return keys, ingredients
+
+    @staticmethod
+    def invalidate():
+        """Помечает индексы и каталоги всех процессов как устаревшие
+        после фиксации транзакции, иначе перестроенные параллельно
+        из старых строк копии закрепятся за новой версией."""
+        bump_version_on_commit(VERSION_KEY)
+
+    def get_snapshot(self):
+        version = get_version(VERSION_KEY)
+        if self._snapshot is not None and self._version == version:
+            return self._snapshot
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self.build()
+                    self._version = version
+            return self._snapshot
+        if self._lock.acquire(blocking=False):
+            try:
+                self._snapshot = self.build()
+                self._version = version
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def search(self, prefix, limit):
+        """Возвращает не более limit ингредиентов, название которых
+        начинается с prefix. Без prefix возвращает весь каталог."""
+        keys, ingredients = self.get_snapshot()
+        if not prefix:
+            return ingredients
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = start
+        while (end < len(keys) and end - start < limit
+               and keys[end].startswith(prefix)):
+            end += 1
+        return ingredients[start:end]
+
+
+ingredient_index = IngredientIndex()
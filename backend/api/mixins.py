@@ -0,0 +1,93 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.exceptions import ValidationError
+
+from foodgram.metrics import observe_cache
+
+from .cache import USER_STATE_VERSION_KEY, get_version
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы (ETag) для list и retrieve.
+
+    ETag строится из версий данных в кэше (version_keys), а для
+    авторизованного пользователя ещё и из версии его избранного, корзины
+    и подписок, поэтому персональные флаги остаются верными. При
+    совпадении ответ 304 отдаётся до выборки и сериализации.
+
+    Last-Modified не отдаётся: его точность — секунда, и два изменения
+    за одну секунду дали бы клиенту с одним If-Modified-Since
+    устаревший ответ 304.
+    """
+    version_keys = ()
+    personalized = True
+
+    def get_version_keys(self):
+        return self.version_keys
+
+    def get_etag(self, request):
+        keys = list(self.get_version_keys())
+        user_id = request.user.id or 0 if self.personalized else 0
+        if user_id:
+            keys.append(USER_STATE_VERSION_KEY.format(user_id))
+        versions = [get_version(key) for key in keys]
+        digest = hashlib.md5(
+            f'{user_id}:{":".join(map(str, versions))}'.encode()
+        ).hexdigest()
+        return f'"{digest}"'
+
+    def conditional(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        observe_cache('conditional_get', response is not None)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+        if self.personalized:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+
+class SparseFieldsetMixin:
+    """Параметры ?fields= и ?omit= со списками полей через запятую:
+    ответ содержит только перечисленные в fields поля (или все) без
+    перечисленных в omit. Вьюсет по этому списку пропускает ненужные
+    предвыборки и аннотации.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_sparse_fields(self, available):
+        """Запрошенные поля из available в их порядке или None, если
+        параметров нет. Пустой параметр (?fields=) считается
+        не переданным. Неизвестное поле или пустой итоговый список
+        (всё исключено через omit) — ошибка 400."""
+        params = self.request.query_params
+        selected = {}
+        for param in (self.fields_query_param, self.omit_query_param):
+            names = {name.strip() for name in params.get(param, '').split(',')
+                     if name.strip()}
+            unknown = names - set(available)
+            if unknown:
+                raise ValidationError({param: (
+                    f'Неизвестные поля: {", ".join(sorted(unknown))}')})
+            selected[param] = names
+        if not any(selected.values()):
+            return None
+        if selected[self.fields_query_param]:
+            available = [name for name in available
+                         if name in selected[self.fields_query_param]]
+        fields = tuple(name for name in available
+                       if name not in selected[self.omit_query_param])
+        if not fields:
+            raise ValidationError({self.omit_query_param: (
+                'Исключены все поля')})
+        return fields
@@ -1,8 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from foodgram import constants
 
 
+class KeysetPagination(BasePagination):
+    """Пагинация по курсору: страница выбирается условием на ключ
+    сортировки (например, pub_date и id), а не OFFSET, и не требует
+    COUNT(*), поэтому тысячная страница стоит столько же, сколько первая.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    @staticmethod
+    def reverse_ordering(ordering):
+        return tuple(field[1:] if field.startswith('-') else '-' + field
+                     for field in ordering)
+
+    @staticmethod
+    def position_filter(ordering, position):
+        """Условие «строго после position» для лексикографического
+        порядка по полям ordering."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_position(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.lstrip('-')] for field in self.ordering]
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        cursor = json.dumps({'p': position, 'r': reverse}, default=str)
+        return urlsafe_b64encode(cursor.encode()).decode()
+
+    @staticmethod
+    def get_ordering_field(queryset, name):
+        """Поле модели или аннотации queryset, по которому идёт
+        сортировка."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        """Позиция и направление из параметра cursor. Значения позиции
+        приводятся к типам полей сортировки, чтобы поддельный курсор
+        давал 404, а не ошибку при выполнении запроса."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            position, reverse = cursor['p'], bool(cursor['r'])
+            if not isinstance(position, list) or (
+                    len(position) != len(self.ordering)):
+                raise ValueError
+            position = [
+                self.get_ordering_field(
+                    queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)]
+            if None in position:
+                raise ValueError
+        except (Base64Error, ValueError, TypeError, KeyError,
+                ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        position, reverse = self.decode_cursor(request, queryset)
+        ordering = (self.reverse_ordering(self.ordering) if reverse
+                    else self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.position_filter(ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        self.next_cursor = self.previous_cursor = None
+        if results and has_next:
+            self.next_cursor = self.encode_cursor(
+                self.get_position(results[-1]), False)
+        if results and has_previous:
+            self.previous_cursor = self.encode_cursor(
+                self.get_position(results[0]), True)
+        return results
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
+        })
+
+
 class LimitPagination(PageNumberPagination):
+    """Постраничная пагинация с параметром limit.
+
+    Если у вьюсета задан cursor_ordering, а в запросе передан параметр
+    cursor (в том числе пустой — для первой страницы) и нет page,
+    используется KeysetPagination. Курсор строится по сортировке,
+    заданной queryset явно (например, фильтрами ordering и search
+    рецептов), а без неё — по cursor_ordering.
+    """
     page_size = constants.PAGE_SIZE
     page_size_query_param = 'limit'
+    keyset_paginator = None
+
+    @staticmethod
+    def get_cursor_ordering(queryset, view):
+        """Поля курсора или None, если курсор по сортировке queryset
+        построить нельзя (сортировка по выражению или связанному полю),
+        — тогда остаётся постраничная пагинация."""
+        ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering or not queryset.query.order_by:
+            return ordering
+        ordering = tuple(queryset.query.order_by)
+        if not all(isinstance(field, str) and field != '?'
+                   and LOOKUP_SEP not in field for field in ordering):
+            return None
+        if 'id' not in {field.lstrip('-') for field in ordering}:
+            ordering += ('id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (KeysetPagination.cursor_query_param in request.query_params
+                and self.page_query_param not in request.query_params):
+            ordering = self.get_cursor_ordering(queryset, view)
+            if ordering:
+                self.keyset_paginator = KeysetPagination(
+                    ordering, self.get_page_size(request))
+                return self.keyset_paginator.paginate_queryset(
+                    queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from recipes.models import Recipe, RecipeIngredient
+
+from .serializers import RecipeReadSerializer, image_variant_urls
+
+FIELDS = RecipeReadSerializer.Meta.fields
+AUTHOR_COLUMNS = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed')
+RELATED_COLUMNS = {'author': ('author_id',), 'tags': (), 'ingredients': ()}
+
+
+class RecipeProjection:
+    """Рецепты для чтения без сериализаторов DRF.
+
+    Строки рецептов, авторов, тегов и ингредиентов выбираются через
+    values() (четыре запроса на страницу, как и с предвыборкой), а
+    вложенные словари собираются напрямую. Результат совпадает
+    с RecipeReadSerializer байт в байт, поэтому при изменении полей
+    сериализатора нужно менять и проекцию.
+
+    Если передан fields (см. SparseFieldsetMixin), выбираются только
+    нужные столбцы и аннотации, а запросы авторов, тегов
+    и ингредиентов выполняются, только если эти поля запрошены.
+    """
+
+    def __init__(self, request, authors, fields=None):
+        self.request = request
+        self.authors = authors
+        self.fields = FIELDS if fields is None else fields
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def rows(self, queryset, ordering=()):
+        """Строки рецептов из queryset вьюсета (с фильтрами
+        и аннотациями) без предвыборки. Поля ordering и явной сортировки
+        queryset добавляются для курсора пагинации."""
+        columns = ['id']
+        for name in self.fields:
+            columns.extend(RELATED_COLUMNS.get(name, (name,)))
+        columns.extend(
+            field.lstrip('-')
+            for field in (*ordering, *queryset.query.order_by)
+            if isinstance(field, str) and field != '?')
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys(columns))
+
+    def image_url(self, name):
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.storage.url(name))
+
+    def get_authors(self, rows):
+        return {author['id']: author for author in self.authors.filter(
+            id__in={row['author_id'] for row in rows}
+        ).values(*AUTHOR_COLUMNS)}
+
+    @staticmethod
+    def get_tags(recipe_ids):
+        tags = defaultdict(list)
+        for recipe_id, *tag in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids).order_by('tag_id').values_list(
+                    'recipe_id', 'tag_id', 'tag__name', 'tag__color',
+                    'tag__slug'):
+            tags[recipe_id].append(dict(zip(
+                ('id', 'name', 'color', 'slug'), tag)))
+        return tags
+
+    @staticmethod
+    def get_ingredients(recipe_ids):
+        ingredients = defaultdict(list)
+        for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids).order_by('id').values_list(
+                    'recipe_id', 'ingredient_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount'):
+            ingredients[recipe_id].append(dict(zip(
+                ('id', 'name', 'measurement_unit', 'amount'), ingredient)))
+        return ingredients
+
+    def represent(self, rows):
+        """Список рецептов в том же виде, что и RecipeReadSerializer
+        с полями fields."""
+        if not rows:
+            return []
+        recipe_ids = [row['id'] for row in rows]
+        getters = {
+            'image': lambda row: self.image_url(row['image']),
+            'image_variants': lambda row: image_variant_urls(
+                row['image_variants'], self.request),
+        }
+        if 'tags' in self.fields:
+            tags = self.get_tags(recipe_ids)
+            getters['tags'] = lambda row: tags[row['id']]
+        if 'author' in self.fields:
+            authors = self.get_authors(rows)
+            getters['author'] = lambda row: authors[row['author_id']]
+        if 'ingredients' in self.fields:
+            ingredients = self.get_ingredients(recipe_ids)
+            getters['ingredients'] = lambda row: ingredients[row['id']]
+        getters = [(name, getters.get(name, itemgetter(name)))
+                   for name in self.fields]
+        return [{name: get(row) for name, get in getters} for row in rows]
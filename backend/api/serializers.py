@@ -1,32 +1,105 @@
 import base64
+import binascii
 
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers, status
 from rest_framework.validators import UniqueTogetherValidator
 
 from recipes.models import (Ingredient, FavoritRecipe, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Tag)
 from users.models import Subscription
 
 User = get_user_model()
 
+BASE64_CHUNK_SIZE = 64 * 1024
+
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомное поле для работы с изображениями в формате base64."""
+    """Кастомное поле для работы с изображениями в формате base64.
+
+    Изображение декодируется частями во временный файл на диске
+    (TemporaryUploadedFile, как большие загрузки multipart). Проверка
+    изображения читает его по temporary_file_path, а не целиком
+    в память. Пробелы и переводы строк убираются из каждой части,
+    а хвост части, не кратный четырём символам, переносится
+    в следующую.
+    """
+
+    @staticmethod
+    def decode_to_file(imgstr, file):
+        """Декодирует base64 из imgstr в file, возвращает размер."""
+        size = 0
+        rest = ''
+        for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+            chunk = rest + ''.join(
+                imgstr[start:start + BASE64_CHUNK_SIZE].split())
+            end = len(chunk) - len(chunk) % 4
+            rest = chunk[end:]
+            size += file.write(base64.b64decode(chunk[:end], validate=True))
+        if rest:
+            size += file.write(base64.b64decode(rest, validate=True))
+        return size
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = TemporaryUploadedFile(
+                'temp.' + ext, format.split(':')[-1], 0, None)
+            try:
+                data.size = self.decode_to_file(imgstr, data)
+            except binascii.Error:
+                data.close()
+                self.fail('invalid_image')
+            data.seek(0)
 
         return super().to_internal_value(data)
 
 
-class CustomUserSerializer(UserCreateSerializer):
+def image_variant_urls(value, request):
+    """Ссылки на уменьшенные копии изображения рецепта:
+    {вариант: {формат: url}}."""
+    variants = {}
+    for variant, files in value.items():
+        if variant == 'source':
+            continue
+        variants[variant] = {
+            extension: (request.build_absolute_uri(default_storage.url(
+                name)) if request else default_storage.url(name))
+            for extension, name in files.items()}
+    return variants
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта:
+    {вариант: {формат: url}}."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return image_variant_urls(value, self.context.get('request'))
+
+
+class SparseFieldsMixin:
+    """Сериализатор только с полями из аргумента fields (если он
+    передан), в том числе для many=True."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CustomUserSerializer(SparseFieldsMixin, UserCreateSerializer):
     """Сериализатор для пользователя."""
     is_subscribed = serializers.SerializerMethodField()
 
@@ -36,6 +109,8 @@ class CustomUserSerializer(UserCreateSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -86,21 +161,26 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeReadeSerializer(many=True, read_only=True,
                                                   source='recipeingredients')
     image = Base64ImageField(read_only=True)
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ("id", "tags", "author", "ingredients", "is_favorited",
-                  "is_in_shopping_cart", "name", "image", "text",
-                  "cooking_time")
+                  "is_in_shopping_cart", "name", "image", "image_variants",
+                  "text", "cooking_time")
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return request.user.is_authenticated and FavoritRecipe.objects.filter(
             user=request.user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return request.user.is_authenticated and ShoppingCart.objects.filter(
             user=request.user, recipe=obj).exists()
@@ -134,15 +214,14 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         if not ingredients:
             raise serializers.ValidationError(
                 'Добавьте хотя бы один ингредиент')
-        ingredients_list = set()
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get("id")
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
-                raise serializers.ValidationError("Ингредиент не существует")
-            if ingredient_id in ingredients_list:
-                raise serializers.ValidationError(
-                    "Ингредиент уже добавлен в рецепт")
-            ingredients_list.add(ingredient_id)
+        ingredients_list = {
+            ingredient.get("id") for ingredient in ingredients}
+        if Ingredient.objects.filter(
+                id__in=ingredients_list).count() != len(ingredients_list):
+            raise serializers.ValidationError("Ингредиент не существует")
+        if len(ingredients_list) != len(ingredients):
+            raise serializers.ValidationError(
+                "Ингредиент уже добавлен в рецепт")
         tags = data.get("tags")
         if not tags:
             raise serializers.ValidationError(
@@ -161,6 +240,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                 amount=ingredient.get('amount'),)
             for ingredient in ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -169,33 +249,76 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe=recipe, ingredients=ingredients)
         return recipe
 
+    @classmethod
+    def update_ingredients(cls, ingredients, recipe):
+        """Приводит состав рецепта к ingredients, меняя только
+        отличающиеся строки. Возвращает количества до и после для
+        оставшихся и новых ингредиентов: их пишут bulk_update
+        и bulk_create без сигналов, а удаление ингредиентов учитывают
+        в итогах списков покупок сигналы post_delete."""
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe)}
+        new_amounts = {ingredient['id']: ingredient['amount']
+                       for ingredient in ingredients}
+        old_amounts = {ingredient_id: recipe_ingredient.amount
+                       for ingredient_id, recipe_ingredient
+                       in current.items() if ingredient_id in new_amounts}
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.filter(
+            id__in=[recipe_ingredient.id for ingredient_id, recipe_ingredient
+                    in current.items() if ingredient_id not in new_amounts]
+        ).delete()
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        cls.create_ingredients(
+            [ingredient for ingredient in ingredients
+             if ingredient['id'] not in current], recipe)
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        # Блокируем рецепт, чтобы параллельные правки не перемешались.
+        Recipe.objects.select_for_update().only('id').get(id=instance.id)
+        # Счётчики меняются через F(), поэтому перечитываем их уже под
+        # блокировкой, чтобы save() не записал устаревшие значения.
+        instance.refresh_from_db(fields=('favorites_count',
+                                         'in_carts_count'))
         instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        super().update(instance, validated_data)
-        self.create_ingredients(ingredients, instance)
-        instance.save()
-        return instance
+        ShoppingListItem.objects.change_recipe(
+            instance.id, *self.update_ingredients(ingredients, instance))
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects(
+            [instance], 'tags',
+            Prefetch('recipeingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient').order_by('id')))
         return RecipeReadSerializer(instance,
                                     context=context).data
 
 
 class RecipeSubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор для вывода рецептов в SubscribeListSerializer."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_variants')
 
 
 class SubscribeListSerializer(CustomUserSerializer):
     """Сериализатор для просмотра подписок."""
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
@@ -216,10 +339,10 @@ class SubscribeListSerializer(CustomUserSerializer):
                 status.HTTP_400_BAD_REQUEST)
         return data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeSubscriptionSerializer(
+                obj.limited_recipes, many=True, read_only=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = obj.recipes.all()
@@ -232,9 +355,11 @@ class SubscribeListSerializer(CustomUserSerializer):
 
 class RecipeFavoriteShopSerializer(serializers.ModelSerializer):
     """Cериализатор для списка покупок и избранных рецептов."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -0,0 +1,125 @@
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from foodgram.metrics import observe_cache
+from recipes.models import ShoppingCart, ShoppingListItem
+
+from .cache import bump_version_on_commit, get_version
+from .ingredient_index import VERSION_KEY as INGREDIENTS_VERSION_KEY
+
+CART_VERSION_KEY = 'shopping_cart_version:{}'
+SHOPPING_LIST_KEY = 'shopping_list:{}:{}:{}'
+TITLE = 'Ваш список покупок'
+
+
+class IgnoreFormatNegotiation(DefaultContentNegotiation):
+    """Не даёт параметру format выбирать рендерер: в выгрузке списка
+    покупок он означает формат файла."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def invalidate_cart(user_id):
+    """Сбрасывает сохранённый список покупок после фиксации транзакции,
+    иначе параллельная выгрузка сохранит под новой версией старые
+    строки."""
+    bump_version_on_commit(CART_VERSION_KEY.format(user_id))
+
+
+def invalidate_carts_with_recipe(recipe_id):
+    for user_id in ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True):
+        invalidate_cart(user_id)
+
+
+def get_shopping_list(user):
+    """Итератор строк (название, единица, количество) списка покупок.
+
+    Строки читаются из ShoppingListItem и запоминаются в кэше под ключом
+    из версии корзины пользователя и версии каталога ингредиентов,
+    поэтому повторная выгрузка неизменившейся корзины не обращается
+    к базе. При промахе строки отдаются прямо из итератора запроса
+    и сохраняются в кэш, когда итератор исчерпан.
+    """
+    key = SHOPPING_LIST_KEY.format(
+        user.id,
+        get_version(CART_VERSION_KEY.format(user.id)),
+        get_version(INGREDIENTS_VERSION_KEY))
+    rows = cache.get(key)
+    observe_cache('shopping_list', rows is not None)
+    if rows is not None:
+        yield from rows
+        return
+    rows = []
+    for row in ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+    ).order_by('ingredient__name').iterator():
+        rows.append(row)
+        yield row
+    cache.set(key, rows, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    yield TITLE + '\n\n'
+    for name, unit, amount in rows:
+        yield f'• {name} ({unit}) — {amount}\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    separator = '['
+    for name, unit, amount in rows:
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False)
+        separator = ',\n'
+    yield '[]' if separator == '[' else ']'
+
+
+def render_pdf(rows):
+    """PDF собирается целиком в памяти: reportlab не умеет писать
+    документ по частям."""
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    pdfmetrics.registerFont(
+        TTFont('ShoppingList', settings.SHOPPING_LIST_PDF_FONT))
+    styles = getSampleStyleSheet()
+    for style in ('Title', 'Normal'):
+        styles[style].fontName = 'ShoppingList'
+    story = [Paragraph(TITLE, styles['Title'])]
+    story.extend(
+        Paragraph(f'• {name} ({unit}) — {amount}', styles['Normal'])
+        for name, unit, amount in rows)
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer).build(story)
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+    'pdf': ('application/pdf', render_pdf),
+}
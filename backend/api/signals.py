@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (FavoritRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscription
+
+from .authentication import evict_token_on_commit, evict_user_tokens
+from .cache import (POPULARITY_VERSION_KEY, RECIPES_VERSION_KEY,
+                    TAGS_VERSION_KEY, USER_STATE_VERSION_KEY,
+                    USERS_VERSION_KEY, bump_version_on_commit)
+from .ingredient_index import ingredient_index
+from .shopping_cart import invalidate_cart, invalidate_carts_with_recipe
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает индекс ингредиентов при любом их изменении."""
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_user_cart(instance, **kwargs):
+    """Сбрасывает сохранённый список покупок владельца корзины."""
+    invalidate_cart(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_carts(instance, **kwargs):
+    """Сбрасывает списки покупок всех, у кого рецепт в корзине."""
+    invalidate_carts_with_recipe(instance.id)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient_carts(instance, **kwargs):
+    """Сбрасывает списки покупок при изменении состава рецепта."""
+    invalidate_carts_with_recipe(instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    bump_version_on_commit(TAGS_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(**kwargs):
+    bump_version_on_commit(RECIPES_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_users_version(update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version_on_commit(USERS_VERSION_KEY)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(instance, **kwargs):
+    """Выход (auth/token/logout/) удаляет токен — убираем его из кэша."""
+    evict_token_on_commit(instance.key)
+
+
+@receiver(post_save, sender=User)
+def evict_user_token(instance, update_fields=None, **kwargs):
+    """Сбрасывает закэшированного вместе с токеном пользователя
+    при его изменении, в том числе деактивации."""
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    evict_user_tokens([instance.id])
+
+
+@receiver((post_save, post_delete), sender=FavoritRecipe)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def bump_user_state_version(instance, **kwargs):
+    """Версия персональных флагов: избранного, корзины и подписок."""
+    bump_version_on_commit(USER_STATE_VERSION_KEY.format(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=FavoritRecipe)
+def bump_popularity_version(**kwargs):
+    """Версия порядка рецептов по числу добавлений в избранное."""
+    bump_version_on_commit(POPULARITY_VERSION_KEY)
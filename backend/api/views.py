@@ -1,20 +1,37 @@
+from itertools import chain
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Value,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 
-from rest_framework import status, viewsets
+from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (SAFE_METHODS, AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from .authentication import evict_user_tokens
+from .cache import (POPULARITY_VERSION_KEY, RECIPES_VERSION_KEY,
+                    TAGS_VERSION_KEY, USERS_VERSION_KEY)
+from .catalogue import RenderedCatalogue
 from .filters import IngredientFilter, RecipeFilter
+from .ingredient_index import VERSION_KEY as INGREDIENTS_VERSION_KEY
+from .ingredient_index import ingredient_index
+from .mixins import ConditionalGetMixin, SparseFieldsetMixin
 from .paginators import LimitPagination
 from .permissions import IsOwnerOrReadOnly
+from .projections import RecipeProjection
+from .shopping_cart import (EXPORT_FORMATS, IgnoreFormatNegotiation,
+                            get_shopping_list)
 from recipes.models import (FavoritRecipe, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
 from .serializers import (CustomUserSerializer,
@@ -31,11 +48,49 @@ from users.models import Subscription
 User = get_user_model()
 
 
-class CustomUserViewSet(DjoserUserViewSet):
+def change_counter(queryset, field, delta):
+    """Атомарно (через F()) меняет счётчик field у строк queryset
+    на delta, не опуская его ниже нуля. update() не вызывает post_save,
+    поэтому закэшированные с токенами пользователи сбрасываются здесь."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    if queryset.model is User:
+        evict_user_tokens(queryset.values('id'))
+    return queryset.update(**{field: F(field) + delta})
+
+
+class CustomUserViewSet(ConditionalGetMixin, SparseFieldsetMixin,
+                        DjoserUserViewSet):
     """Вьюсет для пользователя."""
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = LimitPagination
+    cursor_ordering = ('username', 'id')
+    version_keys = (USERS_VERSION_KEY,)
+
+    def get_version_keys(self):
+        if self.action == 'subscriptions':
+            return self.version_keys + (RECIPES_VERSION_KEY,)
+        return self.version_keys
+
+    def get_list_fields(self):
+        return self.get_sparse_fields(self.get_serializer_class().Meta.fields)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action != 'list' or not user.is_authenticated:
+            return queryset
+        fields = self.get_list_fields()
+        if fields is not None and 'is_subscribed' not in fields:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list':
+            kwargs.setdefault('fields', self.get_list_fields())
+        return super().get_serializer(*args, **kwargs)
 
     @action(
         methods=['get'],
@@ -56,86 +111,238 @@ class CustomUserViewSet(DjoserUserViewSet):
                                              data=request.data,
                                              context={"request": request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        Subscription.objects.create(user=user, author=author)
+        with transaction.atomic():
+            Subscription.objects.create(user=user, author=author)
+            change_counter(User.objects.filter(id=author.id),
+                           'followers_count', 1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
+    @transaction.atomic
     def delete_subscribe(self, request, **kwargs):
         author_id = self.kwargs.get('id')
         author = get_object_or_404(User, id=author_id)
 
-        if Subscription.objects.filter(user=request.user,
-                                       author=author).exists():
-            Subscription.objects.filter(user=request.user,
-                                        author=author).delete()
+        deleted, _ = Subscription.objects.filter(user=request.user,
+                                                 author=author).delete()
+        if deleted:
+            change_counter(User.objects.filter(id=author.id),
+                           'followers_count', -1)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def attach_recipes(authors, limit):
+        """Статический метод, одним запросом выбирающий первые limit
+        рецептов каждого автора (ROW_NUMBER() по автору) и раскладывающий
+        их по авторам в памяти."""
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit and limit.isdigit():
+            ranked = recipes.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=[F(field[1:]).desc() if field.startswith('-')
+                          else F(field).asc()
+                          for field in Recipe._meta.ordering],
+            )).values('id', 'row_number')
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.filter(id__in=RawSQL(
+                f'SELECT id FROM ({sql}) ranked WHERE row_number <= %s',
+                (*params, int(limit))))
+        recipes_by_author = {author.id: [] for author in authors}
+        for recipe in recipes.only('id', 'name', 'image', 'image_variants',
+                                   'cooking_time', 'author_id'):
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes_by_author[author.id]
+
     @action(
         detail=False,
         permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
+        return self.conditional(request, self.list_subscriptions)
+
+    def list_subscriptions(self, request):
         user = request.user
+        fields = self.get_sparse_fields(SubscribeListSerializer.Meta.fields)
         queryset = User.objects.filter(subscribing__user=user)
+        if fields is None or 'is_subscribed' in fields:
+            queryset = queryset.annotate(is_subscribed=Value(True))
         pages = self.paginate_queryset(queryset)
+        if fields is None or 'recipes' in fields:
+            self.attach_recipes(pages, request.GET.get('recipes_limit'))
         serializer = SubscribeListSerializer(pages,
                                              many=True,
+                                             fields=fields,
                                              context={'request': request})
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
     queryset = Tag.objects.all()
+    version_keys = (TAGS_VERSION_KEY,)
+    personalized = False
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    catalogue = RenderedCatalogue(
+        TAGS_VERSION_KEY,
+        lambda: TagSerializer(Tag.objects.all(), many=True).data)
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'json':
+            return self.conditional(request, self.catalogue.response)
+        return super().list(request, *args, **kwargs)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
     queryset = Ingredient.objects.all()
+    version_keys = (INGREDIENTS_VERSION_KEY,)
+    personalized = False
     serializer_class = IngredientSerializer
+    catalogue = RenderedCatalogue(
+        INGREDIENTS_VERSION_KEY,
+        lambda: IngredientSerializer(
+            Ingredient.objects.all(), many=True).data)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     permission_classes = (AllowAny, )
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия через индекс в памяти процесса,
+        а с параметром search — ранжированный поиск в базе."""
+        return self.conditional(request, self.search)
+
+    def search(self, request):
+        if request.GET.get('search'):
+            return Response(self.get_serializer(
+                self.filter_queryset(self.get_queryset())[
+                    :settings.INGREDIENT_SEARCH_LIMIT],
+                many=True).data)
+        if (not request.GET.get('name')
+                and request.accepted_renderer.format == 'json'):
+            return self.catalogue.response(request)
+        return Response(ingredient_index.search(
+            request.GET.get('name', ''), settings.INGREDIENT_SEARCH_LIMIT))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, SparseFieldsetMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadSerializer
     pagination_class = LimitPagination
+    cursor_ordering = ('-pub_date', '-id')
+    version_keys = (RECIPES_VERSION_KEY, USERS_VERSION_KEY, TAGS_VERSION_KEY,
+                    INGREDIENTS_VERSION_KEY)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly)
 
+    def get_version_keys(self):
+        if 'ordering' in self.request.GET:
+            return self.version_keys + (POPULARITY_VERSION_KEY,)
+        return self.version_keys
+
+    def get_authors(self):
+        """Авторы с флагом подписки текущего пользователя."""
+        user = self.request.user
+        if user.is_authenticated:
+            return User.objects.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef('pk'))))
+        return User.objects.annotate(is_subscribed=Value(False))
+
+    def get_queryset(self):
+        """Рецепты вместе с автором, тегами, ингредиентами и флагами
+        избранного и списка покупок за фиксированное число запросов."""
+        user = self.request.user
+        queryset = Recipe.objects.all()
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoritRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))))
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False))
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=self.get_authors()),
+            'tags',
+            Prefetch('recipeingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient').order_by('id')))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.list_projection)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, self.retrieve_projection)
+
+    def get_projection(self, request):
+        return RecipeProjection(
+            request, self.get_authors(),
+            self.get_sparse_fields(RecipeReadSerializer.Meta.fields))
+
+    def list_projection(self, request):
+        """Список рецептов через RecipeProjection, без сериализатора."""
+        projection = self.get_projection(request)
+        page = self.paginate_queryset(projection.rows(
+            self.filter_queryset(self.get_queryset()), self.cursor_ordering))
+        return self.get_paginated_response(projection.represent(page))
+
+    def retrieve_projection(self, request):
+        """Рецепт через RecipeProjection. Проверять права на объект
+        не нужно: на чтение IsOwnerOrReadOnly пускает всех."""
+        projection = self.get_projection(request)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = generics.get_object_or_404(
+            projection.rows(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return Response(projection.represent([row])[0])
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeCreateUpdateSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        change_counter(User.objects.filter(id=self.request.user.id),
+                       'recipes_count', 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User.objects.filter(id=instance.author_id),
+                       'recipes_count', -1)
 
     @staticmethod
-    def add_recipe(request, serializer, pk):
+    @transaction.atomic
+    def add_recipe(request, serializer, pk, counter):
         """Статический метод для добавления рецептов в корзину и избранное."""
         serializer = serializer(
             data={'user': request.user.id, 'recipe': pk},
             context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        change_counter(Recipe.objects.filter(id=pk), counter, 1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
-    def delete_recipe(request, model, **kwargs):
+    @transaction.atomic
+    def delete_recipe(request, model, counter, **kwargs):
         """Статический метод для удаления рецептов из корзины и избранного."""
         recipe = get_object_or_404(Recipe, id=kwargs.get('pk'))
-        if model.objects.filter(user=request.user,
-                                recipe=recipe).exists():
-            model.objects.filter(user=request.user,
-                                 recipe=recipe).delete()
+        deleted, _ = model.objects.filter(user=request.user,
+                                          recipe=recipe).delete()
+        if deleted:
+            change_counter(Recipe.objects.filter(id=recipe.id), counter, -1)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -144,49 +351,48 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['post'],
         permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
-        return self.add_recipe(request, FavoriteSerializer, pk)
+        return self.add_recipe(request, FavoriteSerializer, pk,
+                               'favorites_count')
 
     @favorite.mapping.delete
     def delete_favorite(self, request, **kwargs):
-        return self.delete_recipe(request, FavoritRecipe, **kwargs)
+        return self.delete_recipe(request, FavoritRecipe, 'favorites_count',
+                                  **kwargs)
 
     @action(
         methods=['post'],
         detail=True,
         permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk):
-        return self.add_recipe(request, ShoppingCartSerializer, pk)
+        return self.add_recipe(request, ShoppingCartSerializer, pk,
+                               'in_carts_count')
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, **kwargs):
-        return self.delete_recipe(request, ShoppingCart, **kwargs)
+        return self.delete_recipe(request, ShoppingCart,
+                                  'in_carts_count', **kwargs)
 
     @action(
         methods=['get'],
         detail=False,
-        permission_classes=(IsAuthenticated,))
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=IgnoreFormatNegotiation)
     def download_shopping_cart(self, request):
         user = request.user
-        if not user.shoppingcart.exists():
+        export_format = request.GET.get('format', 'txt')
+        if export_format not in EXPORT_FORMATS:
+            return Response('Неподдерживаемый формат списка покупок',
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = get_shopping_list(user)
+        first_row = next(rows, None)
+        if first_row is None:
             return Response('Ваш список покупок пуст',
                             status=status.HTTP_400_BAD_REQUEST)
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shoppingcart__user=user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-
-        shoppingcart_list = 'Ваш список покупок'
-
-        shoppingcart_list += '\n'.join([
-            f"\u2022 {ingredient['ingredient__name']}"
-            f"({ingredient['ingredient__measurement_unit']})"
-            f"-- {ingredient['amount']}\n"
-            for ingredient in ingredients])
-
-        filename = f'{user.username}_shoppingcart_list.txt'
-        response = HttpResponse(
-            content=shoppingcart_list,
-            content_type='text/plain')
+
+        content_type, render = EXPORT_FORMATS[export_format]
+        filename = f'{user.username}_shoppingcart_list.{export_format}'
+        response = StreamingHttpResponse(
+            render(chain((first_row,), rows)),
+            content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
@@ -1,2 +1,7 @@
 PAGE_SIZE = 6
 MAX_LENGTH = 30
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
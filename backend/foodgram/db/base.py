@@ -0,0 +1,58 @@
+from django.db.backends.postgresql import base, creation
+
+from .pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Соединения из пула держат тестовую базу и мешают её удалить.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений в каждом процессе.
+
+    Включается ключом POOL в настройках базы (см. DB_POOL_SIZE
+    в settings.py). Django при этом закрывает соединение в конце
+    каждого запроса (CONN_MAX_AGE = 0), а закрытие возвращает его
+    в пул. Без POOL работает как обычный бэкенд postgresql.
+    """
+
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        params = self.get_connection_params()
+        key = (tuple(sorted(params.items())),
+               self.settings_dict['OPTIONS'].get('isolation_level'))
+        return get_pool(
+            key, size=options['SIZE'], max_lifetime=options['MAX_LIFETIME'],
+            timeout=options['TIMEOUT'],
+            health_checks=options['HEALTH_CHECKS'])
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection, created = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params))
+        if not created:
+            self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django оставит ссылку на соединение до отката транзакции,
+                # поэтому в пул его возвращать нельзя.
+                self.connection.close()
+            pool.release(self.connection)
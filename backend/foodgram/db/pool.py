@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+from foodgram.metrics import (observe_pool_event, observe_pool_size,
+                              observe_pool_wait)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+class ConnectionPool:
+    """Пул соединений psycopg2 одного процесса.
+
+    Одновременно выдаётся не больше size соединений, остальные потоки
+    ждут свободного до timeout секунд. Перед выдачей простаивавшее
+    соединение проверяется запросом SELECT 1 (если health_checks),
+    соединения старше max_lifetime секунд закрываются.
+    """
+
+    def __init__(self, size, max_lifetime, timeout, health_checks):
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_checks = health_checks
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = deque()
+        self.created_at = {}
+        self.in_use = 0
+
+    def expired(self, connection):
+        return (self.max_lifetime is not None
+                and time.monotonic() - self.created_at[connection]
+                >= self.max_lifetime)
+
+    @staticmethod
+    def is_usable(connection):
+        if (connection.closed
+                or connection.get_transaction_status()
+                != TRANSACTION_STATUS_IDLE):
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Error:
+            return False
+        return True
+
+    def discard(self, connection, event):
+        self.created_at.pop(connection, None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        observe_pool_event(event)
+
+    def report(self):
+        observe_pool_size(self.in_use, len(self.idle))
+
+    def acquire(self, connect):
+        """Возвращает пару (соединение, создано ли оно заново).
+        connect создаёт новое соединение, если свободных нет."""
+        started = time.monotonic()
+        if not self.slots.acquire(timeout=self.timeout):
+            observe_pool_event('timeout')
+            raise OperationalError(
+                f'Пул соединений исчерпан: все {self.size} заняты '
+                f'дольше {self.timeout} с')
+        observe_pool_wait(time.monotonic() - started)
+        try:
+            while True:
+                with self.lock:
+                    if not self.idle:
+                        break
+                    connection = self.idle.pop()
+                if self.expired(connection):
+                    self.discard(connection, 'expired')
+                elif self.health_checks and not self.is_usable(connection):
+                    self.discard(connection, 'health_check_failed')
+                else:
+                    observe_pool_event('reused')
+                    return self.checked_out(connection), False
+            connection = connect()
+            self.created_at[connection] = time.monotonic()
+            observe_pool_event('created')
+            return self.checked_out(connection), True
+        except BaseException:
+            self.slots.release()
+            self.report()
+            raise
+
+    def checked_out(self, connection):
+        with self.lock:
+            self.in_use += 1
+        self.report()
+        return connection
+
+    def release(self, connection):
+        """Возвращает соединение в пул. Незавершённая транзакция
+        откатывается, сломанные и устаревшие соединения закрываются."""
+        if connection not in self.created_at:
+            # Соединение открыто до fork в пуле родительского процесса.
+            return
+        try:
+            status = (TRANSACTION_STATUS_UNKNOWN if connection.closed
+                      else connection.get_transaction_status())
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                self.discard(connection, 'broken')
+            elif self.expired(connection):
+                self.discard(connection, 'expired')
+            else:
+                if status != TRANSACTION_STATUS_IDLE:
+                    try:
+                        connection.rollback()
+                    except Error:
+                        self.discard(connection, 'broken')
+                        return
+                with self.lock:
+                    self.idle.append(connection)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+            self.report()
+
+    def close(self):
+        """Закрывает простаивающие соединения."""
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for connection in idle:
+            self.discard(connection, 'closed')
+        self.report()
+
+
+def get_pool(key, **options):
+    """Пул процесса для параметров подключения key. После fork
+    (например, в процессах нарезки изображений) пулы родителя
+    не используются: их сокеты общие с родительским процессом."""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**options)
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
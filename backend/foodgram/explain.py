@@ -0,0 +1,16 @@
+import json
+
+from django.db import connections
+
+
+def explain(queryset):
+    """План запроса PostgreSQL (EXPLAIN FORMAT JSON) в виде словаря
+    с ключом 'Plan'. Запрос не выполняется."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
@@ -0,0 +1,117 @@
+import ipaddress
+import logging
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+logger = logging.getLogger(__name__)
+
+# Метрики без меток открывают свой файл уже при создании, поэтому
+# каталог нужен до них, даже если его не создал gunicorn.
+if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ('view', 'method'))
+REQUEST_ERRORS = Counter(
+    'foodgram_request_errors_total',
+    'Ответы с кодом 4xx и 5xx',
+    ('view', 'method', 'status'))
+DB_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Число SQL-запросов на запрос',
+    ('view',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')))
+DB_DURATION = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Время SQL-запросов на запрос',
+    ('view',))
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшам: result — hit или miss',
+    ('cache', 'result'))
+
+DB_POOL_CONNECTIONS = Gauge(
+    'foodgram_db_pool_connections',
+    'Соединения в пулах: state — in_use или idle',
+    ('state',),
+    multiprocess_mode='livesum')
+DB_POOL_EVENTS = Counter(
+    'foodgram_db_pool_events_total',
+    'События пула: created, reused, expired, health_check_failed, '
+    'broken, closed, timeout',
+    ('event',))
+DB_POOL_WAIT = Histogram(
+    'foodgram_db_pool_wait_seconds',
+    'Ожидание свободного соединения в пуле',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5,
+             float('inf')))
+
+
+def observe_request(view, method, status, timings, queries):
+    """Учитывает запрос, замеренный RequestTimingMiddleware."""
+    view = view or 'unresolved'
+    REQUEST_DURATION.labels(view, method).observe(timings['total'] / 1000)
+    DB_QUERIES.labels(view).observe(queries)
+    DB_DURATION.labels(view).observe(timings['db'] / 1000)
+    if status >= 400:
+        REQUEST_ERRORS.labels(view, method, status).inc()
+
+
+def observe_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def observe_pool_event(event):
+    DB_POOL_EVENTS.labels(event).inc()
+
+
+def observe_pool_wait(seconds):
+    DB_POOL_WAIT.observe(seconds)
+
+
+def observe_pool_size(in_use, idle):
+    DB_POOL_CONNECTIONS.labels('in_use').set(in_use)
+    DB_POOL_CONNECTIONS.labels('idle').set(idle)
+
+
+def allowed_networks():
+    """Сети из METRICS_ALLOWED_NETWORKS. Ошибочные записи
+    пропускаются с предупреждением в логе."""
+    networks = []
+    for network in settings.METRICS_ALLOWED_NETWORKS:
+        try:
+            networks.append(ipaddress.ip_network(network))
+        except ValueError:
+            logger.warning('Неверная сеть в METRICS_ALLOWED_NETWORKS: %r',
+                           network)
+    return networks
+
+
+def is_internal(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in allowed_networks())
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus для внутренних адресов
+    и сотрудников. Под gunicorn с PROMETHEUS_MULTIPROC_DIR значения
+    всех воркеров собираются из их файлов."""
+    if not (request.user.is_staff
+            or is_internal(request.META.get('REMOTE_ADDR', ''))):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
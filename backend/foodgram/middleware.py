@@ -0,0 +1,132 @@
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import observe_request
+
+logger = logging.getLogger('foodgram.slow_requests')
+
+WORST_QUERIES = 3
+SQL_LOG_LENGTH = 1000
+
+
+class RequestMetrics:
+    """Замеры одного запроса: SQL (через execute_wrapper), код
+    представления и рендеринг ответа."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.worst = []
+        self.view_started = self.view_finished = self.rendered = None
+        self.view_db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            if len(self.worst) < WORST_QUERIES:
+                heapq.heappush(self.worst, (duration, sql))
+            elif duration > self.worst[0][0]:
+                heapq.heapreplace(self.worst, (duration, sql))
+
+    def start_view(self, view):
+        self.view = view
+        self.view_started = time.perf_counter()
+        self.view_db_time = self.db_time
+
+    def finish_view(self):
+        if self.view_started is not None and self.view_finished is None:
+            self.view_finished = time.perf_counter()
+            self.view_db_time = self.db_time - self.view_db_time
+
+    def finish_render(self, response):
+        self.rendered = time.perf_counter()
+
+    def timings(self):
+        """Длительности в миллисекундах: SQL, код представления без SQL
+        (в DRF это в основном сериализация), рендеринг и весь запрос."""
+        total = time.perf_counter() - self.started
+        app = render = 0.0
+        if self.view_finished is not None:
+            app = max(0.0, self.view_finished - self.view_started
+                      - self.view_db_time)
+            if self.rendered is not None:
+                render = self.rendered - self.view_finished
+        return {name: round(value * 1000, 2) for name, value in (
+            ('db', self.db_time), ('app', app), ('render', render),
+            ('total', total))}
+
+
+class RequestTimingMiddleware:
+    """Замеряет каждый запрос: число и время SQL-запросов, время кода
+    представления и рендеринга, с пометкой вьюсета и действия
+    (например, RecipeViewSet.list).
+
+    При SERVER_TIMING замеры отдаются в заголовке Server-Timing.
+    Запросы дольше SLOW_REQUEST_MS пишутся в лог foodgram.slow_requests
+    одной JSON-строкой вместе с самыми долгими SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        metrics.finish_view()
+        timings = metrics.timings()
+        observe_request(metrics.view, request.method, response.status_code,
+                        timings, metrics.queries)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={timings["db"]};desc="{metrics.queries} SQL"',
+                f'app;dur={timings["app"]}',
+                f'render;dur={timings["render"]}',
+                f'total;dur={timings["total"]};desc="{metrics.view}"'))
+        if 0 < settings.SLOW_REQUEST_MS <= timings['total']:
+            logger.warning(json.dumps({
+                'view': metrics.view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': metrics.queries,
+                **{f'{name}_ms': value for name, value in timings.items()},
+                'worst_sql': [
+                    {'ms': round(duration * 1000, 2),
+                     'sql': sql[:SQL_LOG_LENGTH]}
+                    for duration, sql in sorted(metrics.worst, reverse=True)],
+            }, ensure_ascii=False))
+        return response
+
+    @staticmethod
+    def view_name(request, view_func):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            return (f'{view_func.__module__}.'
+                    f'{getattr(view_func, "__qualname__", "view")}')
+        method = request.method.lower()
+        actions = getattr(view_func, 'actions', None) or {}
+        return f'{view_class.__name__}.{actions.get(method, method)}'
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.start_view(self.view_name(request, view_func))
+
+    def process_template_response(self, request, response):
+        request.metrics.finish_view()
+        response.add_post_render_callback(request.metrics.finish_render)
+        return response
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .explain import explain
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки для больших таблиц.
+
+    В PostgreSQL число строк сначала берётся из оценки планировщика
+    (EXPLAIN), и только если она не больше ADMIN_EXACT_COUNT_LIMIT,
+    выполняется точный COUNT(*). Номера последних страниц на больших
+    таблицах поэтому приблизительные.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = int(explain(queryset.order_by())['Plan']['Plan Rows'])
+            if estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
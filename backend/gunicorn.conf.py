@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+import shutil
+
+# Каталог файлов метрик Prometheus воркеров. PROMETHEUS_MULTIPROC_DIR
+# задаётся в on_starting только процессам gunicorn: команды manage.py
+# в том же контейнере держат метрики в памяти и файлов не создают.
+METRICS_DIR = os.getenv('GUNICORN_METRICS_DIR', '/tmp/foodgram_metrics')
+
+bind = '0.0.0.0:8000'
+
+# Потоки (gthread) держат соединения к базе открытыми между запросами:
+# воркер берёт их из своего пула (DB_POOL_SIZE в settings.py), поэтому
+# потоков не больше размера пула, иначе лишние ждут свободного
+# соединения. Всего к PostgreSQL открывается до workers * DB_POOL_SIZE
+# соединений: при max_connections = 100 по умолчанию это 8 * 4 = 32
+# и ещё остаётся запас на миграции и админку.
+worker_class = 'gthread'
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', min(2 * multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.getenv(
+    'GUNICORN_THREADS', max(int(os.getenv('DB_POOL_SIZE', 4)), 1)))
+
+# Приложение загружается в каждом воркере, а не в мастере: метрики
+# Prometheus создают свои файлы при импорте, до on_starting, а пулы
+# соединений и процессов должны создаваться уже после fork. Экономия
+# памяти от preload для этого приложения невелика, зато HUP подхватывает
+# новый код без полного перезапуска.
+preload_app = False
+
+# Воркеры перезапускаются после max_requests запросов (со случайным
+# разбросом, чтобы не все сразу), это ограничивает рост памяти.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def on_starting(server):
+    """Удаляет файлы метрик, оставшиеся от прошлого запуска,
+    и включает метрики нескольких процессов для воркеров."""
+    if METRICS_DIR:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        os.makedirs(METRICS_DIR)
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = METRICS_DIR
+        # prometheus_client выбирает режим при импорте, поэтому он
+        # импортируется после переменной. Импорт заранее, а не в
+        # child_exit: тот вызывается из обработчика сигнала и может
+        # прервать ещё не завершённый импорт.
+        import prometheus_client.multiprocess  # noqa: F401
+
+
+def child_exit(server, worker):
+    """Убирает из метрик завершившегося воркера его гейджи."""
+    if METRICS_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
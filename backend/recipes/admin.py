@@ -1,40 +1,60 @@
 from django.contrib import admin
 
+from foodgram.paginators import EstimatedCountPaginator
 from recipes.models import (FavoritRecipe, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
 
 
 class RecipeIngredientInLine(admin.TabularInline):
     model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'author', 'favorites_count')
-    list_filter = ('name', 'author', 'tags')
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author', 'tags')
+    readonly_fields = ('favorites_count', 'in_carts_count')
     inlines = (RecipeIngredientInLine, )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    @admin.display(description='В избранном')
-    def favorites_count(self, obj):
-        return obj.favorites.count()
+    def get_queryset(self, request):
+        # Автор нужен в __str__ рецепта, в том числе в автодополнении.
+        return super().get_queryset(request).select_related('author')
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name', )
+    search_fields = ('^name', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(FavoritRecipe)
 class FavoritRecipeAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
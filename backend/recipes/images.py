@@ -0,0 +1,116 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from api.cache import RECIPES_VERSION_KEY, bump_version
+from foodgram import constants
+
+VARIANTS_DIR = 'recipes/variants'
+FORMATS = (('webp', 'WEBP', {'quality': 80}),
+           ('jpeg', 'JPEG', {'quality': 85, 'progressive': True}))
+
+_executor = None
+
+logger = logging.getLogger('foodgram.images')
+
+
+def generate_variants(image_name, media_root):
+    """Создаёт уменьшенные копии изображения в WebP и JPEG.
+
+    Выполняется в отдельном процессе и не обращается к базе: получает
+    имя исходного файла относительно media_root и возвращает словарь
+    {вариант: {формат: имя файла}}. В имена копий входит и расширение
+    исходного файла: у temp.png и temp.jpeg они не должны совпасть.
+    """
+    stem = os.path.basename(image_name).replace('.', '_')
+    os.makedirs(os.path.join(media_root, VARIANTS_DIR), exist_ok=True)
+    variants = {'source': image_name}
+    with Image.open(os.path.join(media_root, image_name)) as original:
+        original = original.convert('RGB')
+        for variant, size in constants.IMAGE_VARIANTS.items():
+            image = original.copy()
+            image.thumbnail((size, size))
+            variants[variant] = {}
+            for extension, image_format, options in FORMATS:
+                name = f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+                image.save(os.path.join(media_root, name), image_format,
+                           **options)
+                variants[variant][extension] = name
+    return variants
+
+
+def variant_files(variants):
+    return {name for variant, files in variants.items()
+            if variant != 'source' for name in files.values()}
+
+
+def delete_variants(variants, keep=None):
+    """Удаляет файлы копий variants, кроме входящих в keep."""
+    for name in variant_files(variants) - variant_files(keep or {}):
+        default_storage.delete(name)
+
+
+def save_variants(recipe_id, future):
+    """Сохраняет готовые варианты, если изображение рецепта с тех пор
+    не сменилось, и удаляет копии прежнего изображения. Версия
+    рецептов обновляется, иначе клиенты с ETag не увидят копии."""
+    from recipes.models import Recipe
+
+    try:
+        variants = future.result()
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().filter(
+                id=recipe_id, image=variants['source']
+            ).only('image_variants').first()
+            if recipe is not None:
+                Recipe.objects.filter(id=recipe_id).update(
+                    image_variants=variants)
+        if recipe is None:
+            # Рецепт удалён или его изображение снова сменилось.
+            delete_variants(variants)
+            return
+        delete_variants(recipe.image_variants, keep=variants)
+        bump_version(RECIPES_VERSION_KEY)
+    except Exception:
+        logger.exception(
+            'Не удалось сохранить копии изображения рецепта %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(settings.IMAGE_PROCESSING_WORKERS)
+    return _executor
+
+
+def schedule_variants(recipe):
+    """Ставит нарезку изображения рецепта в очередь пула процессов после
+    фиксации транзакции. При IMAGE_PROCESSING_WORKERS = 0 нарезка
+    выполняется сразу, в текущем процессе."""
+    if not recipe.image or (
+            recipe.image_variants.get('source') == recipe.image.name):
+        return
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        stale = recipe.image_variants
+        recipe.image_variants = generate_variants(
+            recipe.image.name, str(settings.MEDIA_ROOT))
+        type(recipe).objects.filter(id=recipe.id).update(
+            image_variants=recipe.image_variants)
+        transaction.on_commit(
+            partial(delete_variants, stale, keep=recipe.image_variants))
+        return
+
+    def submit():
+        future = get_executor().submit(
+            generate_variants, recipe.image.name, str(settings.MEDIA_ROOT))
+        future.add_done_callback(partial(save_variants, recipe.id))
+
+    transaction.on_commit(submit)
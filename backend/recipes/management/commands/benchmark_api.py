@@ -0,0 +1,199 @@
+import json
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, ShoppingCart
+from users.models import User
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет эндпоинты API на текущей базе: задержки p50/p95/p99, '
+            'пропускную способность, число SQL-запросов и размер ответа. '
+            'Сохраняет результаты в JSON и сравнивает с сохранёнными '
+            'ранее. Запускать на наполненной базе (seed_fixtures)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Замеров на эндпоинт')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Прогревочных запросов на эндпоинт')
+        parser.add_argument('--only', default='',
+                            help='Замерять только эндпоинты, в названии '
+                                 'которых есть эта строка')
+        parser.add_argument('--save', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare',
+                            help='Сравнить с результатами из JSON и '
+                                 'завершиться с ошибкой при регрессии')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимый рост p95 при сравнении (доля)')
+
+    @staticmethod
+    def make_client(token=None):
+        host = next((host for host in settings.ALLOWED_HOSTS
+                     if host and '*' not in host
+                     and not host.startswith('.')), 'localhost')
+        if token is None:
+            return Client(HTTP_HOST=host)
+        return Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {token}')
+
+    @staticmethod
+    def endpoints():
+        """Список (название, авторизован ли, запросы одного замера).
+        Запрос — пара (метод, путь)."""
+        cart = ShoppingCart.objects.filter(
+            user__favorites__isnull=False).select_related('user').first()
+        if cart is None:
+            raise CommandError('В базе нет пользователей с избранным '
+                               'и корзиной: сначала запустите seed_fixtures')
+        user = cart.user
+        recipe = Recipe.objects.select_related('author').prefetch_related(
+            'tags').exclude(favorites__user=user).exclude(
+            shoppingcart__user=user).first()
+        author = User.objects.exclude(id=user.id).exclude(
+            subscribing__user=user).first()
+        tag = recipe.tags.first()
+        ingredient = Ingredient.objects.first()
+        name = quote(ingredient.name[:3])
+        read = [
+            ('recipes', '/api/recipes/'),
+            ('recipes?tags', f'/api/recipes/?tags={tag.slug}'),
+            ('recipes?author', f'/api/recipes/?author={recipe.author_id}'),
+            ('recipes?search', f'/api/recipes/?search={quote(recipe.name)}'),
+            ('recipes?ordering',
+             '/api/recipes/?ordering=-favorites_count'),
+            ('recipes?cursor', '/api/recipes/?cursor='),
+            ('recipes?fields',
+             '/api/recipes/?fields=id,name,image,cooking_time,tags'),
+            ('recipe', f'/api/recipes/{recipe.id}/'),
+            ('users', '/api/users/'),
+            ('user', f'/api/users/{author.id}/'),
+            ('tags', '/api/tags/'),
+            ('ingredients', '/api/ingredients/'),
+            ('ingredients?name', f'/api/ingredients/?name={name}'),
+            ('ingredients?search', f'/api/ingredients/?search={name}'),
+        ]
+        endpoints = [(f'{label} anon', False, [('get', path)])
+                     for label, path in read]
+        endpoints += [(f'{label} auth', True, [('get', path)])
+                      for label, path in read]
+        endpoints += [
+            ('recipes?is_favorited auth', True,
+             [('get', '/api/recipes/?is_favorited=1')]),
+            ('recipes?is_in_shopping_cart auth', True,
+             [('get', '/api/recipes/?is_in_shopping_cart=1')]),
+            ('users/me auth', True, [('get', '/api/users/me/')]),
+            ('subscriptions auth', True,
+             [('get', '/api/users/subscriptions/?recipes_limit=3')]),
+            ('subscriptions?omit auth', True,
+             [('get', '/api/users/subscriptions/?omit=recipes')]),
+            ('download_shopping_cart auth', True,
+             [('get', '/api/recipes/download_shopping_cart/')]),
+            ('favorite toggle auth', True,
+             [('post', f'/api/recipes/{recipe.id}/favorite/'),
+              ('delete', f'/api/recipes/{recipe.id}/favorite/')]),
+            ('shopping_cart toggle auth', True,
+             [('post', f'/api/recipes/{recipe.id}/shopping_cart/'),
+              ('delete', f'/api/recipes/{recipe.id}/shopping_cart/')]),
+            ('subscribe toggle auth', True,
+             [('post', f'/api/users/{author.id}/subscribe/'),
+              ('delete', f'/api/users/{author.id}/subscribe/')]),
+        ]
+        return user, endpoints
+
+    @staticmethod
+    def call(client, requests):
+        """Выполняет запросы одного замера и возвращает размер ответа
+        первого из них."""
+        size = None
+        for method, path in requests:
+            response = getattr(client, method)(path)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {path}: {response.status_code}')
+            content = (b''.join(response.streaming_content)
+                       if response.streaming else response.content)
+            if size is None:
+                size = len(content)
+        return size
+
+    def measure(self, client, requests, iterations, warmup):
+        for _ in range(warmup):
+            self.call(client, requests)
+        timings, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                size = self.call(client, requests)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(context))
+        timings.sort()
+        return {
+            'p50': round(percentile(timings, 0.50) * 1000, 2),
+            'p95': round(percentile(timings, 0.95) * 1000, 2),
+            'p99': round(percentile(timings, 0.99) * 1000, 2),
+            'rps': round(len(timings) / sum(timings), 1),
+            'queries': max(queries),
+            'bytes': size,
+        }
+
+    @staticmethod
+    def regressions(results, baseline, tolerance):
+        found = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['p95'] > base['p95'] * (1 + tolerance):
+                found.append(f'{name}: p95 {base["p95"]} -> '
+                             f'{result["p95"]} мс')
+            if result['queries'] > base['queries']:
+                found.append(f'{name}: запросов {base["queries"]} -> '
+                             f'{result["queries"]}')
+        return found
+
+    def handle(self, *args, **options):
+        user, endpoints = self.endpoints()
+        token, _ = Token.objects.get_or_create(user=user)
+        clients = {False: self.make_client(), True: self.make_client(token)}
+        self.stdout.write(
+            f'{"эндпоинт":<34}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"rps":>9}{"SQL":>6}{"байт":>9}')
+        results = {}
+        for name, authenticated, requests in endpoints:
+            if options['only'] not in name:
+                continue
+            result = self.measure(clients[authenticated], requests,
+                                  options['iterations'], options['warmup'])
+            results[name] = result
+            self.stdout.write(
+                f'{name:<34}{result["p50"]:>9}{result["p95"]:>9}'
+                f'{result["p99"]:>9}{result["rps"]:>9}'
+                f'{result["queries"]:>6}{result["bytes"]:>9}')
+        if options['save']:
+            Path(options['save']).write_text(
+                json.dumps(results, ensure_ascii=False, indent=2),
+                encoding='utf-8')
+            self.stdout.write(f'Результаты сохранены в {options["save"]}')
+        if options['compare']:
+            baseline = json.loads(
+                Path(options['compare']).read_text(encoding='utf-8'))
+            found = self.regressions(
+                results, baseline, options['tolerance'])
+            if found:
+                for line in found:
+                    self.stdout.write(self.style.ERROR(line))
+                raise CommandError(f'Регрессий: {len(found)}')
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
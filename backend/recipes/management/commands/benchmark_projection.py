@@ -0,0 +1,87 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+
+from api.projections import RecipeProjection
+from api.renderers import ORJSONRenderer
+from api.views import RecipeViewSet
+from recipes.models import FavoritRecipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает выдачу рецептов через RecipeReadSerializer '
+            'и через RecipeProjection: процессорное время на рецепт, '
+            'число SQL-запросов и совпадение JSON байт в байт. '
+            'Запускать на наполненной базе (seed_fixtures)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, action='append',
+                            help='Размер страницы, можно указать '
+                                 'несколько раз (по умолчанию 6, 100 и 500)')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Замеров на страницу')
+
+    @staticmethod
+    def make_view(user):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = user
+        return RecipeViewSet(request=request, format_kwarg=None,
+                             action='list', kwargs={})
+
+    @staticmethod
+    def serialize(view, size):
+        queryset = view.filter_queryset(view.get_queryset())[:size]
+        return view.get_serializer(queryset, many=True).data
+
+    @staticmethod
+    def project(view, size):
+        projection = RecipeProjection(view.request, view.get_authors())
+        return projection.represent(list(projection.rows(
+            view.filter_queryset(view.get_queryset()))[:size]))
+
+    def measure(self, build, view, size, iterations):
+        """Процессорное время на рецепт в микросекундах, число
+        запросов и JSON одной страницы."""
+        with CaptureQueriesContext(connection) as context:
+            content = ORJSONRenderer().render(build(view, size))
+        started = time.process_time()
+        for _ in range(iterations):
+            build(view, size)
+        spent = time.process_time() - started
+        return (round(spent / iterations / size * 10 ** 6, 1),
+                len(context), content)
+
+    def handle(self, *args, **options):
+        favorite = FavoritRecipe.objects.select_related('user').first()
+        if favorite is None:
+            raise CommandError('В базе нет рецептов в избранном: '
+                               'сначала запустите seed_fixtures')
+        self.stdout.write(
+            f'{"страница":<22}{"сериализатор, мкс":>19}'
+            f'{"проекция, мкс":>15}{"SQL":>9}{"байт":>10}')
+        mismatched = []
+        for label, user in (('anon', AnonymousUser()),
+                            ('auth', favorite.user)):
+            view = self.make_view(user)
+            for size in options['page_size'] or (6, 100, 500):
+                name = f'{label} x{size}'
+                serialized = self.measure(
+                    self.serialize, view, size, options['iterations'])
+                projected = self.measure(
+                    self.project, view, size, options['iterations'])
+                if serialized[2] != projected[2]:
+                    mismatched.append(name)
+                self.stdout.write(
+                    f'{name:<22}{serialized[0]:>19}{projected[0]:>15}'
+                    f'{f"{serialized[1]}/{projected[1]}":>9}'
+                    f'{len(projected[2]):>10}')
+        if mismatched:
+            raise CommandError(
+                f'JSON проекции отличается: {", ".join(mismatched)}')
+        self.stdout.write(self.style.SUCCESS(
+            'JSON проекции совпадает с сериализатором'))
@@ -0,0 +1,95 @@
+import io
+import json
+import time
+import tracemalloc
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.serializers import IngredientSerializer
+from api.views import RecipeViewSet
+from recipes.models import Ingredient
+
+from .benchmark_api import percentile
+
+RENDERERS = (('json', JSONRenderer, JSONParser),
+             ('orjson', ORJSONRenderer, ORJSONParser))
+
+
+def measure(func, iterations):
+    """Время вызова func в миллисекундах (p50, p95) и пик памяти
+    одного вызова в КиБ."""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (round(percentile(timings, 0.50) * 1000, 3),
+            round(percentile(timings, 0.95) * 1000, 3),
+            round(peak / 1024, 1))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает рендереры и парсеры JSON (стандартный DRF '
+            'и orjson) на больших страницах рецептов и каталоге '
+            'ингредиентов: время, пик памяти и размер ответа')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, action='append',
+                            help='Размер страницы рецептов, можно '
+                                 'указать несколько раз (по умолчанию '
+                                 '6, 100 и 500)')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Замеров на набор данных')
+
+    @staticmethod
+    def recipe_page(size):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        view = RecipeViewSet(request=request, format_kwarg=None,
+                             action='list')
+        return view.get_serializer(
+            view.get_queryset()[:size], many=True).data
+
+    def handle(self, *args, **options):
+        datasets = {
+            f'рецепты x{size}': self.recipe_page(size)
+            for size in options['page_size'] or (6, 100, 500)}
+        datasets['ингредиенты'] = IngredientSerializer(
+            Ingredient.objects.all(), many=True).data
+        if not all(datasets.values()):
+            raise CommandError('В базе нет рецептов или ингредиентов: '
+                               'сначала запустите seed_fixtures')
+        self.stdout.write(
+            f'{"данные":<18}{"рендерер":<10}{"p50":>9}{"p95":>9}'
+            f'{"КиБ":>9}{"разбор p50":>12}{"КиБ":>9}{"байт":>10}')
+        for name, data in datasets.items():
+            rendered = {}
+            for label, renderer_class, parser_class in RENDERERS:
+                renderer, parser = renderer_class(), parser_class()
+                content = rendered[label] = renderer.render(data)
+                render = measure(lambda: renderer.render(data),
+                                 options['iterations'])
+                parse = measure(
+                    lambda: parser.parse(io.BytesIO(content),
+                                         parser_context={}),
+                    options['iterations'])
+                self.stdout.write(
+                    f'{name:<18}{label:<10}{render[0]:>9}{render[1]:>9}'
+                    f'{render[2]:>9}{parse[0]:>12}{parse[2]:>9}'
+                    f'{len(content):>10}')
+            if len({json.dumps(json.loads(content), sort_keys=True)
+                    for content in rendered.values()}) > 1:
+                raise CommandError(f'{name}: рендереры дают разный JSON')
+        self.stdout.write(self.style.SUCCESS('JSON всех рендереров совпадает'))
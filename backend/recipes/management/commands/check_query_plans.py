@@ -0,0 +1,168 @@
+from urllib.parse import urlencode
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from rest_framework.request import Request
+
+from api.views import IngredientViewSet, RecipeViewSet
+from foodgram.constants import PAGE_SIZE
+from foodgram.explain import explain
+from recipes.models import (FavoritRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem)
+from users.models import Subscription, User
+
+LARGE_TABLES = {
+    model._meta.db_table for model in (
+        Recipe, Recipe.tags.through, RecipeIngredient, FavoritRecipe,
+        ShoppingCart, ShoppingListItem, Subscription, User)}
+
+
+def seq_scans(plan, tables):
+    """Имена таблиц из tables, которые план читает последовательно."""
+    found = []
+    if (plan['Node Type'] == 'Seq Scan'
+            and plan['Relation Name'] in tables):
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found.extend(seq_scans(child, tables))
+    return found
+
+
+def checked_tables(min_pages):
+    """Большие таблицы, в которых не меньше min_pages страниц.
+    Таблицу в несколько страниц планировщик обоснованно читает целиком,
+    например, пользователей в hash join подписок."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relname FROM pg_class '
+            'WHERE relname = ANY(%s) AND relpages >= %s',
+            [sorted(LARGE_TABLES), min_pages])
+        return {name for name, in cursor.fetchall()}
+
+
+def index_names(plan):
+    """Имена индексов, которые читает план."""
+    found = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', ()):
+        found |= index_names(child)
+    return found
+
+
+def filtered(viewset_class, user, **params):
+    """Запрос списка вьюсета с такими параметрами, как его строит
+    сам вьюсет (с фильтрами и сортировкой)."""
+    http_request = HttpRequest()
+    http_request.GET = QueryDict(urlencode(params))
+    request = Request(http_request)
+    request.user = user
+    view = viewset_class(request=request, format_kwarg=None, action='list')
+    return view.filter_queryset(view.get_queryset())
+
+
+def recipe_list(user, **params):
+    """Основной запрос страницы списка рецептов."""
+    return filtered(RecipeViewSet, user, **params)[:PAGE_SIZE]
+
+
+def get_plan(queryset, seqscan=True):
+    """План запроса. С seqscan=False последовательное сканирование
+    запрещено, и Seq Scan в плане остаётся, только если ни один индекс
+    запросу не подходит."""
+    if seqscan:
+        return explain(queryset)['Plan']
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return explain(queryset)['Plan']
+
+
+class Command(BaseCommand):
+    help = ('Проверяет планы основных запросов API (EXPLAIN) и завершается '
+            'с ошибкой, если какой-то из них читает большую таблицу '
+            'последовательным сканированием, а поисковые запросы '
+            'не могут использовать свои индексы. Запускать на наполненной '
+            'базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Сначала обновить статистику планировщика (ANALYZE)')
+        parser.add_argument(
+            '--min-pages', type=int, default=100,
+            help='Seq Scan по таблице меньше стольких страниц по 8 КиБ '
+                 'не считается ошибкой (по умолчанию 100)')
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='Строить планы с enable_seqscan = off: проверяет, что '
+                 'каждому запросу подходит индекс, независимо от объёма '
+                 'данных (для тестов на маленькой базе)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с PostgreSQL')
+        favorite = FavoritRecipe.objects.select_related(
+            'user', 'recipe').first()
+        ingredient = Ingredient.objects.filter(
+            id__in=RecipeIngredient.objects.values('ingredient_id')).first()
+        tag = Recipe.tags.through.objects.select_related('tag').first()
+        if favorite is None or ingredient is None or tag is None:
+            raise CommandError('В базе нет рецептов, тегов или избранного')
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        user = favorite.user
+        queries = {
+            'recipes': recipe_list(user),
+            'recipes?author': recipe_list(
+                user, author=favorite.recipe.author_id),
+            'recipes?tags': recipe_list(user, tags=tag.tag.slug),
+            'recipes?is_favorited': recipe_list(user, is_favorited=1),
+            'recipes?is_in_shopping_cart': recipe_list(
+                user, is_in_shopping_cart=1),
+            'recipes?ordering': recipe_list(
+                user, ordering='-favorites_count'),
+            'users/subscriptions': User.objects.filter(
+                subscribing__user=user)[:PAGE_SIZE],
+            'download_shopping_cart': ShoppingListItem.objects.filter(
+                user=user).values_list(
+                    'ingredient__name', 'ingredient__measurement_unit',
+                    'total_amount').order_by('ingredient__name'),
+            'recipe ingredients by ingredient': RecipeIngredient.objects
+            .filter(ingredient=ingredient).order_by(),
+        }
+        searches = {
+            'recipes?search': (
+                recipe_list(user, search=favorite.recipe.name.split()[0]),
+                'recipe_search_vector_idx'),
+            'ingredients?search': (
+                filtered(IngredientViewSet, user,
+                         search=ingredient.name[:5]),
+                'ingredient_name_trgm_idx'),
+        }
+        seqscan = not options['no_seqscan']
+        tables = (checked_tables(options['min_pages']) if seqscan
+                  else LARGE_TABLES)
+        failed = []
+        for name, (queryset, index) in searches.items():
+            if index in index_names(get_plan(queryset, seqscan=False)):
+                self.stdout.write(f'{name}: {index}')
+            else:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: индекс {index} не используется'))
+        for name, queryset in queries.items():
+            plan = get_plan(queryset, seqscan)
+            scanned = seq_scans(plan, tables)
+            if scanned:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: Seq Scan по {", ".join(sorted(set(scanned)))}'))
+            else:
+                self.stdout.write(
+                    f'{name}: {plan["Node Type"]}, '
+                    f'стоимость {plan["Total Cost"]}')
+        if failed:
+            raise CommandError(
+                f'Запросов с неподходящим планом: {len(failed)}')
+        self.stdout.write(self.style.SUCCESS('Планы запросов в порядке'))
@@ -1,27 +1,170 @@
 import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from recipes.models import Ingredient
+from api.cache import TAGS_VERSION_KEY, bump_version
+from api.ingredient_index import VERSION_KEY as INGREDIENTS_VERSION_KEY
+from recipes.models import Ingredient, Tag
+
+DATA_DIR = settings.BASE_DIR / 'data'
+
+
+class CSVStream:
+    """Файлоподобный объект для COPY: строки из пачек batches
+    превращаются в CSV по мере чтения, так что файл не хранится
+    в памяти целиком. После каждой пачки вызывается on_batch(пачка)."""
+
+    def __init__(self, batches, on_batch):
+        self.batches = batches
+        self.on_batch = on_batch
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            batch = next(self.batches, None)
+            if batch is None:
+                break
+            chunk = io.StringIO()
+            csv.writer(chunk).writerows(batch)
+            self.buffer += chunk.getvalue()
+            self.on_batch(batch)
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class Command(BaseCommand):
-    help = 'Загружает ингредиенты из файла data/ingredients.csv'
+    help = ('Загружает ингредиенты из CSV или JSON файла (по умолчанию '
+            'data/ingredients.csv) и теги из data/tags.json')
 
-    def handle(self, *args, **options):
-        with open('data/ingredients.csv', 'r',
-                  encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            created_count = 0
-            for row in reader:
-                name, unit = row
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=unit)
-                if created:
-                    created_count += 1
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='ingredients.csv',
+            help='Файл с ингредиентами: путь или имя файла в data/')
+        parser.add_argument(
+            '--tags', default='tags.json',
+            help='Файл с тегами: путь или имя файла в data/')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки строк для COPY или bulk_create')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только прочитать файлы и посчитать новые записи')
+
+    @staticmethod
+    def resolve(path):
+        path = Path(path)
+        if not path.exists() and (DATA_DIR / path).exists():
+            path = DATA_DIR / path
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        return path
+
+    @staticmethod
+    def read_ingredients(path):
+        """Итератор пар (название, единица измерения) из CSV или JSON."""
+        with open(path, encoding='utf-8') as file:
+            if path.suffix == '.json':
+                for row in json.load(file):
+                    yield row['name'], row['measurement_unit']
+            else:
+                for name, unit in csv.reader(file):
+                    yield name, unit
 
+    @staticmethod
+    def batches(rows, size):
+        rows = iter(rows)
+        while batch := list(islice(rows, size)):
+            yield batch
+
+    def progress(self):
+        """Обработчик пачки, выводящий число обработанных строк."""
+        loaded = 0
+
+        def on_batch(batch):
+            nonlocal loaded
+            loaded += len(batch)
+            self.stdout.write(f'Обработано строк: {loaded}')
+        return on_batch
+
+    def copy_ingredients(self, path, batch_size):
+        """Быстрый путь для PostgreSQL: COPY во временную таблицу и один
+        INSERT ... ON CONFLICT DO NOTHING в таблицу ингредиентов. Файл
+        читается потоком, пачками по batch_size строк."""
+        stream = CSVStream(self.batches(self.read_ingredients(path),
+                                        batch_size),
+                           self.progress())
+        table = Ingredient._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredient_staging FROM STDIN WITH (FORMAT csv)',
+                stream)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+                'DO NOTHING')
+            return cursor.rowcount
+
+    def bulk_ingredients(self, path, batch_size):
+        before = Ingredient.objects.count()
+        on_batch = self.progress()
+        for batch in self.batches(self.read_ingredients(path), batch_size):
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch),
+                ignore_conflicts=True)
+            on_batch(batch)
+        return Ingredient.objects.count() - before
+
+    def load_tags(self, path, dry_run):
+        with open(path, encoding='utf-8') as file:
+            tags = [Tag(**tag) for tag in json.load(file)]
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        new_count = len({tag.slug for tag in tags} - existing)
+        if not dry_run:
+            Tag.objects.bulk_create(tags, ignore_conflicts=True)
+        return new_count
+
+    def handle(self, *args, **options):
+        path = self.resolve(options['path'])
+        tags_path = self.resolve(options['tags'])
+        if options['dry_run']:
+            existing = set(Ingredient.objects.values_list(
+                'name', 'measurement_unit'))
+            rows = set(self.read_ingredients(path))
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'Добавлено {created_count} ингредиентов'
-                )
+                f'Прочитано {len(rows)} ингредиентов, '
+                f'новых: {len(rows - existing)}; '
+                f'новых тегов: {self.load_tags(tags_path, True)}')
+            return
+
+        if connection.vendor == 'postgresql':
+            created_count = self.copy_ingredients(
+                path, options['batch_size'])
+        else:
+            created_count = self.bulk_ingredients(
+                path, options['batch_size'])
+        tags_count = self.load_tags(tags_path, False)
+        # COPY и bulk_create не вызывают сигналы, сбрасывающие каталоги.
+        if created_count:
+            bump_version(INGREDIENTS_VERSION_KEY)
+        if tags_count:
+            bump_version(TAGS_VERSION_KEY)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Добавлено {created_count} ингредиентов '
+                f'и {tags_count} тегов'
             )
+        )
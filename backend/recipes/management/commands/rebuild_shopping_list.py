@@ -0,0 +1,49 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from api.shopping_cart import invalidate_cart
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает таблицу итогов списков покупок по корзинам '
+            'и сверяет её с агрегацией')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Только сверить таблицу, не пересобирая её')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            with transaction.atomic():
+                totals = ShoppingListItem.objects.live_totals()
+                user_ids = set(ShoppingListItem.objects.values_list(
+                    'user_id', flat=True).distinct())
+                user_ids.update(user_id for user_id, _ in totals)
+                ShoppingListItem.objects.all().delete()
+                ShoppingListItem.objects.bulk_create(
+                    (ShoppingListItem(user_id=user_id,
+                                      ingredient_id=ingredient_id,
+                                      total_amount=total)
+                     for (user_id, ingredient_id), total in totals.items()),
+                    batch_size=1000)
+                # Сохранённые списки покупок построены по старым итогам.
+                for user_id in user_ids:
+                    invalidate_cart(user_id)
+            self.stdout.write('Таблица итогов пересобрана')
+
+        expected = ShoppingListItem.objects.live_totals()
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')}
+        mismatched = expected.keys() ^ actual.keys() | {
+            key for key in expected.keys() & actual.keys()
+            if expected[key] != actual[key]}
+        if mismatched:
+            raise CommandError(
+                f'Расхождений с агрегацией: {len(mismatched)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги совпадают с агрегацией: {len(actual)} позиций'))
@@ -0,0 +1,62 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoritRecipe, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': (FavoritRecipe, 'recipe'),
+        'in_carts_count': (ShoppingCart, 'recipe'),
+    },
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Subscription, 'author'),
+    },
+}
+
+
+def count_related(model, field):
+    """Подзапрос с числом строк model, ссылающихся полем field
+    на текущую строку."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(count=Count('*'))
+        .values('count')), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики рецептов '
+            'и пользователей по исходным таблицам')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Только найти расхождения, не исправляя их')
+
+    def handle(self, *args, **options):
+        mismatched_total = 0
+        for model, counters in COUNTERS.items():
+            expected = {f'expected_{counter}': count_related(*source)
+                        for counter, source in counters.items()}
+            mismatch = Q()
+            for counter in counters:
+                mismatch |= ~Q(**{counter: F(f'expected_{counter}')})
+            with transaction.atomic():
+                ids = list(model.objects.annotate(**expected).filter(
+                    mismatch).values_list('pk', flat=True))
+                if ids and not options['verify_only']:
+                    model.objects.filter(pk__in=ids).update(**{
+                        counter: count_related(*source)
+                        for counter, source in counters.items()})
+            mismatched_total += len(ids)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: '
+                f'расхождений {len(ids)}')
+        if options['verify_only'] and mismatched_total:
+            raise CommandError(
+                f'Счётчики расходятся с исходными таблицами: '
+                f'{mismatched_total} строк')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
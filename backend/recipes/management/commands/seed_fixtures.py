@@ -0,0 +1,231 @@
+import csv
+import io
+import random
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import (POPULARITY_VERSION_KEY, RECIPES_VERSION_KEY,
+                       USERS_VERSION_KEY, bump_version)
+from recipes.models import (FavoritRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+IMAGE_NAME = 'recipes/images/seed.png'
+DISHES = ('Суп', 'Салат', 'Пирог', 'Рагу', 'Омлет', 'Плов', 'Запеканка',
+          'Паста', 'Каша', 'Бульон', 'Рулет', 'Котлеты', 'Блины', 'Жаркое')
+STYLES = ('по-домашнему', 'с курицей', 'с грибами', 'с сыром',
+          'с овощами', 'из печи', 'по-деревенски', 'с зеленью',
+          'на скорую руку', 'с рисом', 'со сметаной', 'с томатами')
+SENTENCES = ('Нарежьте все ингредиенты.', 'Разогрейте сковороду.',
+             'Доведите до кипения и убавьте огонь.', 'Посолите по вкусу.',
+             'Перемешайте и оставьте на десять минут.',
+             'Выпекайте до золотистой корочки.', 'Подавайте горячим.',
+             'Украсьте зеленью перед подачей.')
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими данными для нагрузочных '
+            'проверок: пользователи, рецепты, избранное и корзины '
+            'с распределением Ципфа, граф подписок. Ингредиенты и теги '
+            'нужно загрузить заранее (load_base)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Число пользователей')
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help='Число рецептов')
+        parser.add_argument('--favorites', type=int, default=100000,
+                            help='Сколько раз добавить рецепты в избранное')
+        parser.add_argument('--carts', type=int, default=20000,
+                            help='Сколько раз добавить рецепты в корзины')
+        parser.add_argument('--follows', type=int, default=20000,
+                            help='Число подписок')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель распределения Ципфа')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Зерно генератора случайных чисел')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Размер пачки для COPY или bulk_create')
+        parser.add_argument('--password', default='password',
+                            help='Пароль всех созданных пользователей')
+
+    @staticmethod
+    def zipf_weights(count, exponent):
+        """Накопленные веса рангов 1..count для random.choices."""
+        return list(accumulate(1 / rank ** exponent
+                               for rank in range(1, count + 1)))
+
+    @staticmethod
+    def batches(rows, size):
+        rows = iter(rows)
+        while batch := list(islice(rows, size)):
+            yield batch
+
+    @staticmethod
+    def copy_batch(model, fields, batch):
+        """Быстрый путь для PostgreSQL: COPY пачки во временную таблицу
+        и INSERT ... ON CONFLICT DO NOTHING. Не переданные столбцы
+        заполняются значениями полей по умолчанию."""
+        opts = model._meta
+        columns = [opts.get_field(field).column for field in fields]
+        rest = [field for field in opts.concrete_fields
+                if not field.primary_key and field.column not in columns]
+        now = timezone.now()
+        rest_values = [
+            field.get_db_prep_save(
+                now if getattr(field, 'auto_now_add', False)
+                else field.get_default(), connection)
+            for field in rest]
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        selected = ', '.join(columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE seed_staging AS '
+                f'SELECT {selected} FROM {opts.db_table} WITH NO DATA')
+            cursor.copy_expert(
+                'COPY seed_staging FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {opts.db_table} '
+                f'({", ".join(columns + [field.column for field in rest])}) '
+                f'SELECT {", ".join([selected] + ["%s"] * len(rest))} '
+                f'FROM seed_staging ON CONFLICT DO NOTHING',
+                rest_values)
+            cursor.execute('DROP TABLE seed_staging')
+
+    def bulk_create(self, model, fields, rows, batch_size):
+        """Создаёт строки model из кортежей значений fields пачками
+        и возвращает число новых строк. Дубликаты уникальных пар
+        пропускаются."""
+        before = model.objects.count()
+        for batch in self.batches(rows, batch_size):
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    self.copy_batch(model, fields, batch)
+                else:
+                    model.objects.bulk_create(
+                        (model(**dict(zip(fields, row))) for row in batch),
+                        ignore_conflicts=True)
+        created = model.objects.count() - before
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: добавлено {created}')
+        return created
+
+    @staticmethod
+    def new_ids(model, start):
+        return list(model.objects.filter(id__gt=start).order_by(
+            'id').values_list('id', flat=True))
+
+    @staticmethod
+    def max_id(model):
+        return model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+    def pairs(self, rnd, left, right, count, exponent, distinct=False):
+        """count пар (left, right): правые выбираются по Ципфу, левые
+        по Ципфу с меньшим показателем, в случайном порядке рангов."""
+        left_weights = self.zipf_weights(len(left), exponent / 2)
+        right_weights = self.zipf_weights(len(right), exponent)
+        left = rnd.sample(left, len(left))
+        right = rnd.sample(right, len(right))
+        for _ in range(count):
+            first = rnd.choices(left, cum_weights=left_weights)[0]
+            second = rnd.choices(right, cum_weights=right_weights)[0]
+            if not distinct or first != second:
+                yield first, second
+
+    def create_users(self, count, password, batch_size):
+        start = self.max_id(User)
+        password = make_password(password)
+        self.bulk_create(
+            User, ('username', 'email', 'first_name', 'last_name',
+                   'password'),
+            ((f'user{start + number}', f'user{start + number}@example.com',
+              'Имя', 'Фамилия', password)
+             for number in range(1, count + 1)), batch_size)
+        return self.new_ids(User, start)
+
+    def create_recipes(self, rnd, count, authors, exponent, batch_size):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new('RGB', (640, 480), (230, 160, 90)).save(buffer, 'PNG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        author_weights = self.zipf_weights(len(authors), exponent)
+        authors = rnd.sample(authors, len(authors))
+        start = self.max_id(Recipe)
+        self.bulk_create(
+            Recipe, ('author_id', 'name', 'text', 'image', 'cooking_time'),
+            ((rnd.choices(authors, cum_weights=author_weights)[0],
+              f'{rnd.choice(DISHES)} {rnd.choice(STYLES)}',
+              ' '.join(rnd.sample(SENTENCES, rnd.randint(2, 5))),
+              IMAGE_NAME, rnd.randint(5, 180))
+             for _ in range(count)), batch_size)
+        return self.new_ids(Recipe, start)
+
+    def recipe_ingredients(self, rnd, recipes, ingredients, exponent):
+        weights = self.zipf_weights(len(ingredients), exponent)
+        ingredients = rnd.sample(ingredients, len(ingredients))
+        for recipe_id in recipes:
+            chosen = set(rnd.choices(ingredients, cum_weights=weights,
+                                     k=rnd.randint(3, 10)))
+            for ingredient_id in sorted(chosen):
+                yield recipe_id, ingredient_id, rnd.randint(1, 500)
+
+    @staticmethod
+    def recipe_tags(rnd, recipes, tags):
+        for recipe_id in recipes:
+            for tag_id in rnd.sample(tags, rnd.randint(1, min(3, len(tags)))):
+                yield recipe_id, tag_id
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        exponent = options['zipf']
+        batch_size = options['batch_size']
+        ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+        tags = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        if not ingredients or not tags:
+            raise CommandError(
+                'Сначала загрузите ингредиенты и теги: manage.py load_base')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы два пользователя и один рецепт')
+
+        users = self.create_users(
+            options['users'], options['password'], batch_size)
+        recipes = self.create_recipes(
+            rnd, options['recipes'], users, exponent, batch_size)
+        self.bulk_create(
+            RecipeIngredient, ('recipe_id', 'ingredient_id', 'amount'),
+            self.recipe_ingredients(rnd, recipes, ingredients, exponent),
+            batch_size)
+        self.bulk_create(
+            Recipe.tags.through, ('recipe_id', 'tag_id'),
+            self.recipe_tags(rnd, recipes, tags), batch_size)
+        for model, count in ((FavoritRecipe, options['favorites']),
+                             (ShoppingCart, options['carts'])):
+            self.bulk_create(
+                model, ('user_id', 'recipe_id'),
+                self.pairs(rnd, users, recipes, count, exponent),
+                batch_size)
+        self.bulk_create(
+            Subscription, ('user_id', 'author_id'),
+            self.pairs(rnd, users, users, options['follows'], exponent,
+                       distinct=True),
+            batch_size)
+
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_list', stdout=self.stdout)
+        call_command('update_search_vectors', stdout=self.stdout)
+        # bulk_create не вызывает сигналы, сбрасывающие кэш ответов.
+        for key in (RECIPES_VERSION_KEY, USERS_VERSION_KEY,
+                    POPULARITY_VERSION_KEY):
+            bump_version(key)
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
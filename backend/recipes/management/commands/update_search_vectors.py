@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы всех рецептов'
+
+    def handle(self, *args, **options):
+        updated = Recipe.objects.all().update_search_vector()
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлено {updated} рецептов'))
@@ -1,9 +1,12 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core import validators
-from django.db import models
+from django.db import connection, models
 from users.models import User
 
 MAX_LENGTH = 100
+SEARCH_CONFIG = 'russian'
 
 
 class Ingredient(models.Model):
@@ -23,6 +26,9 @@ class Ingredient(models.Model):
             models.UniqueConstraint(
                 fields=['name', 'measurement_unit'],
                 name='unique_name_measurement_unit')]
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'],
+                     name='ingredient_name_trgm_idx')]
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
@@ -49,6 +55,18 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор: название весит больше
+        описания. Поле есть только в PostgreSQL."""
+        if connection.vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)))
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(
@@ -62,6 +80,11 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images/',
         verbose_name='Изображение рецепта')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения')
     text = models.TextField(
         verbose_name='Описание рецепта')
     pub_date = models.DateTimeField(
@@ -79,11 +102,34 @@ class Recipe(models.Model):
         'Время приготовления в минутах',
         validators=[validators.MinValueValidator(
             1, message='Минимальное время приголовления 1 минута.')])
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('name',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx')]
 
     def __str__(self):
         return f'Рецепт {self.name}, автор {self.author}'
@@ -156,3 +202,132 @@ class ShoppingCart(AbstractFavoritShoppingCart):
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
                 name='unique_shoppingcart')]
+
+
+class ShoppingListItemManager(models.Manager):
+    """Инкрементальное обновление итогов списка покупок.
+
+    Методы нужно вызывать внутри той же транзакции, что и изменение
+    корзины или состава рецепта.
+    """
+
+    def apply_deltas(self, deltas):
+        """Прибавляет к итогам изменения {(user_id, ingredient_id): delta},
+        удаляя позиции, итог которых стал нулевым.
+
+        Существующие позиции блокируются в порядке (user_id,
+        ingredient_id), чтобы параллельные изменения корзин и рецептов
+        не взаимоблокировались. Новые позиции вставляются через
+        insert_totals: две транзакции могут одновременно создавать одну
+        и ту же позицию.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in deltas},
+                ingredient_id__in={ingredient_id for _, ingredient_id
+                                   in deltas}
+            ).order_by('user_id', 'ingredient_id')}
+        to_insert, to_update, to_delete = {}, [], []
+        for key, delta in deltas.items():
+            item = items.get(key)
+            if item is None:
+                if delta > 0:
+                    to_insert[key] = delta
+                continue
+            item.total_amount += delta
+            if item.total_amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.id)
+        self.insert_totals(to_insert)
+        self.bulk_update(to_update, ('total_amount',))
+        self.filter(id__in=to_delete).delete()
+
+    def insert_totals(self, totals):
+        """Создаёт позиции {(user_id, ingredient_id): amount}. Если
+        позицию уже создала другая транзакция, amount прибавляется к её
+        итогу (INSERT ... ON CONFLICT DO UPDATE, есть и в SQLite)."""
+        if not totals:
+            return
+        opts = self.model._meta
+        table = connection.ops.quote_name(opts.db_table)
+        user, ingredient, total = (
+            connection.ops.quote_name(opts.get_field(name).column)
+            for name in ('user', 'ingredient', 'total_amount'))
+        rows = sorted(totals.items())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user}, {ingredient}, {total}) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(rows))} '
+                f'ON CONFLICT ({user}, {ingredient}) DO UPDATE '
+                f'SET {total} = {table}.{total} + EXCLUDED.{total}',
+                [value for (user_id, ingredient_id), amount in rows
+                 for value in (user_id, ingredient_id, amount)])
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Учитывает рецепт, добавленный в корзину пользователя."""
+        self.apply_deltas({
+            (user_id, ingredient_id): sign * amount
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe_id=recipe_id).values_list('ingredient_id', 'amount')})
+
+    def remove_recipe(self, user_id, recipe_id):
+        """Учитывает рецепт, убранный из корзины пользователя."""
+        self.add_recipe(user_id, recipe_id, sign=-1)
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта ({ingredient_id: amount}
+        до и после) в итоги всех, у кого рецепт в корзине."""
+        changes = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()}
+        self.apply_deltas({
+            (user_id, ingredient_id): delta
+            for user_id in ShoppingCart.objects.filter(
+                recipe_id=recipe_id).values_list('user_id', flat=True)
+            for ingredient_id, delta in changes.items()})
+
+    @staticmethod
+    def live_totals():
+        """Итоги, посчитанные по корзинам заново:
+        {(user_id, ingredient_id): total_amount}."""
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in RecipeIngredient.objects
+            .filter(recipe__shoppingcart__isnull=False)
+            .values_list('recipe__shoppingcart__user_id', 'ingredient_id')
+            .annotate(total=models.Sum('amount'))
+            .order_by()}
+
+
+class ShoppingListItem(models.Model):
+    """Денормализованные итоги списка покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        default_related_name = 'shopping_list_items'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item')]
+
+    def __str__(self):
+        return f'{self.user}, {self.ingredient}: {self.total_amount}'
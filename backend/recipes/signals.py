@@ -0,0 +1,95 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models.signals import (post_delete, post_save, pre_migrate,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .images import delete_variants, schedule_variants
+from .models import (Recipe, RecipeIngredient, ShoppingCart,
+                     ShoppingListItem)
+
+
+@receiver(pre_migrate)
+def create_trigram_extension(app_config, using, **kwargs):
+    """Включает pg_trgm до создания триграммных индексов ингредиентов."""
+    connection = connections[using]
+    if app_config.name != 'recipes' or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+@receiver(post_save, sender=Recipe)
+def make_image_variants(instance, **kwargs):
+    """Запускает нарезку нового изображения рецепта."""
+    schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_image_variants(instance, **kwargs):
+    """Удаляет копии изображения удалённого рецепта."""
+    transaction.on_commit(partial(delete_variants, instance.image_variants))
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(instance, **kwargs):
+    """Пересчитывает поисковый вектор сохранённого рецепта."""
+    Recipe.objects.filter(id=instance.id).update_search_vector()
+
+
+# Итоги списков покупок (ShoppingListItem) поддерживаются сигналами,
+# поэтому остаются верными при любых изменениях корзин и составов
+# рецептов через модели: в API, админке и при каскадном удалении
+# рецепта, пользователя или ингредиента. bulk_create и bulk_update
+# сигналов не посылают, их итоги учитывает вызывающий код
+# (см. RecipeCreateUpdateSerializer.update).
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_saved_row(sender, instance, raw=False, **kwargs):
+    """Запоминает строку до изменения, чтобы post_save учёл разницу."""
+    instance.saved_row = None
+    if instance.pk is not None and not raw:
+        instance.saved_row = sender.objects.filter(pk=instance.pk).values(
+            *(field.attname for field in sender._meta.concrete_fields)
+        ).first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_totals(instance, raw=False, **kwargs):
+    if raw:
+        return
+    saved = instance.saved_row
+    if saved is not None:
+        ShoppingListItem.objects.remove_recipe(
+            saved['user_id'], saved['recipe_id'])
+    ShoppingListItem.objects.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart_totals(instance, **kwargs):
+    ShoppingListItem.objects.remove_recipe(
+        instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def change_ingredient_totals(instance, raw=False, **kwargs):
+    if raw:
+        return
+    saved = instance.saved_row
+    if saved is not None:
+        ShoppingListItem.objects.change_recipe(
+            saved['recipe_id'], {saved['ingredient_id']: saved['amount']},
+            {})
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id, {}, {instance.ingredient_id: instance.amount})
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_ingredient_totals(instance, **kwargs):
+    """При удалении рецепта его ингредиенты и корзины удаляются
+    каскадом в любом порядке: что удалено первым, то и вычитает
+    ингредиенты из итогов, второе уже ничего не находит."""
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}, {})
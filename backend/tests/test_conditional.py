@@ -0,0 +1,28 @@
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+
+from recipes.models import Tag
+
+from .utils import LOCAL_CACHE
+
+
+@LOCAL_CACHE
+class ConditionalGetTest(APITestCase):
+    """Условные GET-запросы только по ETag."""
+
+    def test_etag(self):
+        response = self.client.get('/api/tags/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_is_ignored(self):
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=http_date(2 ** 32))
+        self.assertEqual(response.status_code, 200)
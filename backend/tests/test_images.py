@@ -0,0 +1,35 @@
+import base64
+from io import BytesIO
+
+from PIL import Image
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from api.serializers import BASE64_CHUNK_SIZE, Base64ImageField
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Изображение base64 декодируется во временный файл на диске."""
+
+    @staticmethod
+    def png(size):
+        buffer = BytesIO()
+        Image.effect_noise(size, 64).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_decodes_to_temporary_file(self):
+        content = self.png((400, 400))
+        encoded = base64.encodebytes(content).decode()
+        self.assertGreater(len(encoded), BASE64_CHUNK_SIZE * 2)
+        image = Base64ImageField().to_internal_value(
+            'data:image/png;base64,' + encoded)
+        self.assertTrue(hasattr(image, 'temporary_file_path'))
+        self.assertEqual(image.size, len(content))
+        image.seek(0)
+        self.assertEqual(image.read(), content)
+        image.close()
+
+    def test_invalid_base64(self):
+        with self.assertRaises(ValidationError):
+            Base64ImageField().to_internal_value(
+                'data:image/png;base64,not*base64')
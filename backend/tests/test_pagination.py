@@ -0,0 +1,62 @@
+import json
+from base64 import urlsafe_b64encode
+
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+
+from .utils import LOCAL_CACHE, create_recipes, create_user
+
+
+@LOCAL_CACHE
+class CursorPaginationTest(APITestCase):
+    """Курсор обходит рецепты в том же порядке, что и страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        recipes = create_recipes([create_user(1), create_user(2)], 10)
+        for number, recipe in enumerate(recipes):
+            Recipe.objects.filter(id=recipe.id).update(
+                favorites_count=number * 7 % 4)
+
+    def walk(self, params):
+        """id рецептов всех страниц курсора вперёд и затем назад."""
+        forward = []
+        response = self.client.get(
+            '/api/recipes/', {**params, 'cursor': '', 'limit': 3}).json()
+        while True:
+            forward += [recipe['id'] for recipe in response['results']]
+            if not response['next']:
+                break
+            response = self.client.get(response['next']).json()
+        backward = []
+        while True:
+            backward = [recipe['id']
+                        for recipe in response['results']] + backward
+            if not response['previous']:
+                break
+            response = self.client.get(response['previous']).json()
+        return forward, backward
+
+    def test_cursor_keeps_ordering(self):
+        for params in ({}, {'ordering': '-favorites_count'},
+                       {'search': 'Рецепт'}):
+            with self.subTest(params=params):
+                expected = [recipe['id'] for recipe in self.client.get(
+                    '/api/recipes/', {**params, 'limit': 100}
+                ).json()['results']]
+                self.assertEqual(len(expected), 10)
+                self.assertEqual(self.walk(params), (expected, expected))
+
+    def test_forged_cursor(self):
+        for url, position in (('/api/recipes/', ['garbage', 'x']),
+                              ('/api/recipes/', [None, None]),
+                              ('/api/recipes/', [1]),
+                              ('/api/users/', [1, 'zz'])):
+            cursor = urlsafe_b64encode(json.dumps(
+                {'p': position, 'r': False}).encode()).decode()
+            with self.subTest(url=url, position=position):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/recipes/', {'cursor': 'не base64'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.projections import RecipeProjection
+from api.renderers import ORJSONRenderer
+from api.views import RecipeViewSet
+from recipes.models import FavoritRecipe, Recipe, ShoppingCart
+from users.models import Subscription
+
+from .utils import LOCAL_CACHE, create_recipes, create_user
+
+
+@LOCAL_CACHE
+class RecipeProjectionTest(APITestCase):
+    """RecipeProjection отдаёт тот же JSON, что и RecipeReadSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        authors = [create_user(number) for number in range(1, 4)]
+        recipes = create_recipes(authors, 9)
+        for recipe in recipes[::2]:
+            FavoritRecipe.objects.create(user=cls.user, recipe=recipe)
+        for recipe in recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, author=authors[0])
+        Recipe.objects.filter(id=recipes[0].id).update(image_variants={
+            'source': 'recipes/images/test.png',
+            'small': {'webp': 'recipes/variants/test_png_small.webp',
+                      'jpeg': 'recipes/variants/test_png_small.jpg'}})
+
+    @staticmethod
+    def make_view(user, fields=None):
+        params = {} if fields is None else {'fields': ','.join(fields)}
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = user
+        return RecipeViewSet(request=request, format_kwarg=None,
+                             action='list', kwargs={})
+
+    @staticmethod
+    def render(data):
+        return ORJSONRenderer().render(data)
+
+    def assert_same_json(self, user, fields=None):
+        view = self.make_view(user, fields)
+        queryset = view.filter_queryset(view.get_queryset())
+        serialized = view.get_serializer(queryset, many=True).data
+        if fields is not None:
+            serialized = [{name: recipe[name] for name in fields}
+                          for recipe in serialized]
+        projection = RecipeProjection(view.request, view.get_authors(),
+                                      fields)
+        projected = projection.represent(list(projection.rows(queryset)))
+        self.assertEqual(len(projected), 9)
+        self.assertEqual(self.render(projected), self.render(serialized))
+
+    def test_anonymous(self):
+        self.assert_same_json(AnonymousUser())
+
+    def test_authenticated(self):
+        self.assert_same_json(self.user)
+
+    def test_sparse_fields(self):
+        self.assert_same_json(
+            self.user, ('id', 'author', 'is_favorited', 'image'))
@@ -0,0 +1,52 @@
+from rest_framework.test import APITestCase
+
+from recipes.models import FavoritRecipe, ShoppingCart
+from users.models import Subscription
+
+from .utils import LOCAL_CACHE, create_recipes, create_user
+
+
+@LOCAL_CACHE
+class QueryCountTest(APITestCase):
+    """Страница стоит одинакового числа запросов при любом размере."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.authors = [create_user(number) for number in range(1, 6)]
+        recipes = create_recipes(cls.authors, 30)
+        for recipe in recipes[::2]:
+            FavoritRecipe.objects.create(user=cls.user, recipe=recipe)
+        for recipe in recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.authors:
+            Subscription.objects.create(user=cls.user, author=author)
+        cls.recipe = recipes[0]
+
+    def assert_page_queries(self, url, limits, queries):
+        for limit in limits:
+            with self.subTest(url=url, limit=limit), \
+                    self.assertNumQueries(queries):
+                response = self.client.get(url, {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_recipe_list(self):
+        # count, рецепты, авторы, теги, ингредиенты
+        self.assert_page_queries('/api/recipes/', (2, 30), 5)
+        self.client.force_authenticate(self.user)
+        self.assert_page_queries('/api/recipes/', (2, 30), 5)
+
+    def test_recipe_detail(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_subscriptions(self):
+        self.client.force_authenticate(self.user)
+        # count, авторы, рецепты всех авторов страницы
+        self.assert_page_queries('/api/users/subscriptions/', (1, 5), 3)
+        with self.assertNumQueries(3):
+            self.client.get('/api/users/subscriptions/',
+                            {'limit': 5, 'recipes_limit': 2})
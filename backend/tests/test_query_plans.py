@@ -0,0 +1,34 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from recipes.models import FavoritRecipe, ShoppingCart
+from users.models import Subscription
+
+from .utils import LOCAL_CACHE, create_recipes, create_user
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN только в PostgreSQL')
+@LOCAL_CACHE
+class QueryPlanTest(TestCase):
+    """Каждому основному запросу API, включая поиск рецептов
+    и ингредиентов, подходит индекс."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = create_user(0)
+        authors = [create_user(number) for number in range(1, 4)]
+        recipes = create_recipes(authors, 10)
+        FavoritRecipe.objects.create(user=user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=recipes[1])
+        Subscription.objects.create(user=user, author=authors[0])
+
+    def test_query_plans(self):
+        stdout = StringIO()
+        call_command('check_query_plans', no_seqscan=True, stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn('recipes?search: recipe_search_vector_idx', output)
+        self.assertIn('ingredients?search: ingredient_name_trgm_idx', output)
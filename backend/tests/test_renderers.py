@@ -0,0 +1,31 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """ORJSONRenderer даёт те же байты, что и JSONRenderer DRF."""
+
+    def test_same_bytes(self):
+        moment = datetime.datetime(2024, 5, 6, 7, 8, 9, 123456,
+                                   tzinfo=datetime.timezone.utc)
+        data = {
+            'aware': moment,
+            'naive': moment.replace(tzinfo=None),
+            'whole': moment.replace(microsecond=0),
+            'date': moment.date(),
+            'time': moment.time(),
+            'uuid': uuid.UUID(int=1),
+            'decimal': Decimal('1.50'),
+            'text': 'Рецепт\u2028',
+            'list': [1, 2.5, None, True],
+        }
+        content = ORJSONRenderer().render(data)
+        self.assertEqual(content, JSONRenderer().render(data))
+        # DRF не отбрасывает микросекунды, поэтому и orjson их оставляет.
+        self.assertIn(b'"2024-05-06T07:08:09.123456Z"', content)
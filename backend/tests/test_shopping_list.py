@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from api.shopping_cart import get_shopping_list
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem)
+
+from .utils import LOCAL_CACHE, create_recipes, create_user
+
+
+@LOCAL_CACHE
+class ShoppingListTest(APITestCase):
+    """Итоги ShoppingListItem совпадают с пересчётом по корзинам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.recipes = create_recipes([cls.user], 4)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def add_to_cart(self, recipe):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+
+    def assert_totals(self):
+        self.assertEqual(
+            {(item.user_id, item.ingredient_id): item.total_amount
+             for item in ShoppingListItem.objects.all()},
+            ShoppingListItem.objects.live_totals())
+        self.assertTrue(ShoppingListItem.objects.exists())
+
+    def test_api(self):
+        for recipe in self.recipes[:3]:
+            self.add_to_cart(recipe)
+        self.assert_totals()
+        recipe = self.recipes[0]
+        ingredients = list(recipe.recipeingredients.order_by('id'))
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', {
+            'tags': list(recipe.tags.values_list('id', flat=True)),
+            'ingredients': [
+                {'id': ingredients[0].ingredient_id, 'amount': 50},
+                {'id': ingredients[1].ingredient_id,
+                 'amount': ingredients[1].amount},
+                {'id': Ingredient.objects.exclude(
+                    ingredient__recipe=recipe).first().id,
+                 'amount': 7}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+        response = self.client.delete(
+            f'/api/recipes/{self.recipes[1].id}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+        response = self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_models(self):
+        """Изменения в обход API, например из админки."""
+        other = create_user(2)
+        carts = [ShoppingCart.objects.create(user=user, recipe=recipe)
+                 for user in (self.user, other)
+                 for recipe in self.recipes[:2]]
+        self.assert_totals()
+        carts[0].recipe = self.recipes[2]
+        carts[0].save()
+        self.assert_totals()
+        carts[1].delete()
+        self.assert_totals()
+        recipe = self.recipes[2]
+        recipe_ingredient = recipe.recipeingredients.first()
+        recipe_ingredient.amount += 10
+        recipe_ingredient.save()
+        self.assert_totals()
+        recipe_ingredient.ingredient = Ingredient.objects.exclude(
+            ingredient__recipe=recipe).first()
+        recipe_ingredient.save()
+        self.assert_totals()
+        RecipeIngredient.objects.create(
+            recipe=recipe, amount=3, ingredient=Ingredient.objects.exclude(
+                ingredient__recipe=recipe).first())
+        self.assert_totals()
+        recipe.recipeingredients.last().delete()
+        self.assert_totals()
+        Recipe.objects.filter(id=self.recipes[0].id).delete()
+        self.assert_totals()
+
+    def test_rebuild_resets_cached_list(self):
+        self.add_to_cart(self.recipes[0])
+        expected = list(get_shopping_list(self.user))
+        ShoppingListItem.objects.update(total_amount=100)
+        # Итоги испорчены в обход корзины, и список ещё не сброшен.
+        self.assertEqual(list(get_shopping_list(self.user)), expected)
+        self.add_to_cart(self.recipes[1])
+        stale = list(get_shopping_list(self.user))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_shopping_list', stdout=StringIO())
+        rebuilt = list(get_shopping_list(self.user))
+        self.assertNotEqual(rebuilt, stale)
+        self.assertEqual(rebuilt, list(ShoppingListItem.objects.filter(
+            user=self.user).values_list(
+                'ingredient__name', 'ingredient__measurement_unit',
+                'total_amount').order_by('ingredient__name')))
@@ -0,0 +1,38 @@
+from rest_framework.test import APITestCase
+
+from .utils import LOCAL_CACHE, create_recipes, create_user
+
+
+@LOCAL_CACHE
+class SparseFieldsTest(APITestCase):
+    """Параметры ?fields= и ?omit=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        create_recipes([cls.user], 2)
+
+    def test_fields(self):
+        response = self.client.get('/api/recipes/', {'fields': 'id,name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(recipe) for recipe in response.json()[
+            'results']], [{'id', 'name'}] * 2)
+
+    def test_empty_params_are_ignored(self):
+        full = self.client.get('/api/recipes/', {}).json()['results']
+        for params in ({'fields': ''}, {'omit': ''},
+                       {'fields': ' , ', 'omit': ''}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/recipes/', params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['results'], full)
+        response = self.client.get('/api/users/', {'fields': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('email', response.json()['results'][0])
+
+    def test_errors(self):
+        for params in ({'fields': 'id,unknown'},
+                       {'fields': 'id', 'omit': 'id'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/recipes/', params)
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import token_cache_key
+from users.models import User
+
+from .utils import LOCAL_CACHE, create_user
+
+
+@LOCAL_CACHE
+class TokenCacheTest(APITestCase):
+    """Закэшированный с токеном пользователь не затирает счётчики,
+    изменённые через F()."""
+
+    def setUp(self):
+        self.author = create_user(1)
+        self.follower = create_user(2)
+        self.token = Token.objects.create(user=self.author)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def cached(self):
+        return caches[settings.AUTH_TOKEN_CACHE].get(
+            token_cache_key(self.token.key))
+
+    def subscribe(self):
+        client = self.client_class()
+        client.force_authenticate(self.follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_counter_change_evicts_token(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(self.cached())
+        self.subscribe()
+        self.assertIsNone(self.cached())
+
+    def test_full_save_keeps_counters(self):
+        stale = User.objects.get(id=self.author.id)
+        self.subscribe()
+        stale.first_name = 'Другое'
+        stale.save()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(self.author.first_name, 'Другое')
+
+    def test_set_password_keeps_counters(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.subscribe()
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'password', 'new_password': 'Nn1-password'})
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
@@ -0,0 +1,39 @@
+from django.test import override_settings
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+# Версии и кэши из файлового кэша по умолчанию пережили бы тест.
+LOCAL_CACHE = override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com', username=f'user{number}',
+        password='password', first_name='Имя', last_name='Фамилия')
+
+
+def create_recipes(authors, count):
+    """count рецептов авторов authors по очереди, у каждого
+    один-три тега и три ингредиента."""
+    tags = [Tag.objects.get_or_create(
+        name=f'Тег {number}', color=f'#00000{number}', slug=f'tag{number}')[0]
+        for number in range(3)]
+    ingredients = [Ingredient.objects.get_or_create(
+        name=f'Ингредиент {number}', measurement_unit='г')[0]
+        for number in range(10)]
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[number % len(authors)], name=f'Рецепт {number}',
+            image='recipes/images/test.png', text='Описание',
+            cooking_time=number + 1)
+        recipe.tags.set(tags[:number % 3 + 1])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe,
+                             ingredient=ingredients[(number + shift) % 10],
+                             amount=shift + 1)
+            for shift in range(3))
+        recipes.append(recipe)
+    return recipes
@@ -1,17 +1,24 @@
 from django.contrib import admin
 
+from foodgram.paginators import EstimatedCountPaginator
 from .models import Subscription, User
 
 
 @admin.register(Subscription)
 class SubscribeAdmin(admin.ModelAdmin):
     list_display = ('author', 'user')
-    search_fields = ('author',)
-    list_filter = ('author', 'user')
+    list_select_related = ('author', 'user')
+    search_fields = ('author__username', 'user__username')
+    autocomplete_fields = ('author', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'first_name', 'last_name', 'email')
-    search_fields = ('username',)
-    list_filter = ('username', 'email')
+    list_display = ('username', 'first_name', 'last_name', 'email',
+                    'recipes_count', 'followers_count')
+    search_fields = ('username', 'email')
+    readonly_fields = ('recipes_count', 'followers_count')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
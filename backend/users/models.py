@@ -16,6 +16,20 @@ class User(AbstractUser):
     last_name = models.CharField(
         verbose_name='Фамилия',
         max_length=constants.MAX_LENGTH)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов')
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков')
+
+    # Счётчики меняются только через F() (api.views.change_counter),
+    # поэтому полное сохранение их не записывает: иначе объект,
+    # загруженный раньше (например, из кэша токенов), вернул бы
+    # в базу старые значения.
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
@@ -28,6 +42,15 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        if (kwargs.get('update_fields') is None and not self._state.adding
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class Subscription(models.Model):
     """Модель подписки."""
@@ -50,7 +73,7 @@ class Subscription(models.Model):
                 fields=['user', 'author'],
                 name='unique_subscriber'),
             models.CheckConstraint(
-                check=Q(user=F('author')),
+                check=~Q(user=F('author')),
                 name='no_subscribe_yourself')]
 
     def __str__(self):